@@ -0,0 +1,147 @@
+"""Fingerprinted, minified and precompressed static assets.
+
+Templates link static files with asset_url('css/stats.css'), which points at
+/assets/css/stats.<hash>.css: a copy of the file named after the hash of its
+content, so browsers can cache it forever and an edited file simply gets a
+new URL. build() writes those copies to static/dist (CSS minified on the
+way) along with .br and .gz variants and a manifest.json mapping each source
+path to its copy.
+
+`flask build-assets` builds ahead of time. Otherwise the first asset_url()
+call in a process builds whatever is missing or out of date; hashing the
+sources to check takes a millisecond, only changed files are compressed
+again.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+import compression
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+ASSET_TYPES = ('.css', '.js')
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def minify_css(css):
+    """Drop comments (except /*! licence */ ones) and the whitespace around CSS punctuation."""
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # Only after a colon: the space before one is a descendant selector (".a :hover")
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def source_paths(static_dir=STATIC_DIR):
+    """Paths (relative to static/, with forward slashes) of every asset, skipping the build output."""
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != DIST_DIR)
+        for name in sorted(files):
+            if name.endswith(ASSET_TYPES):
+                yield os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, '/')
+
+
+def build_asset(path, source):
+    """Write the fingerprinted copy of one asset and its compressed variants. Returns the manifest entry."""
+    data = source
+    if path.endswith('.css') and not path.endswith('.min.css'):
+        data = minify_css(source.decode()).encode()
+    stem, ext = os.path.splitext(path)
+    built = f"{stem}.{_sha256(data)[:10]}{ext}"
+    target = os.path.join(DIST_DIR, built)
+    if not os.path.exists(target):
+        for encoding in compression.encodings():
+            _write_atomic(target + SUFFIXES[encoding], compression.compress(data, encoding,
+                                                                       compression.STATIC_LEVELS[encoding]))
+        _write_atomic(target, data)  # last, so its presence means the variants are there too
+    return {'source_hash': _sha256(source), 'path': built}
+
+
+def build(force=False):
+    """Bring static/dist up to date with static/ and return the manifest."""
+    manifest = {} if force else _read_manifest()
+    fresh = {}
+    for path in source_paths():
+        with open(os.path.join(STATIC_DIR, path), 'rb') as f:
+            source = f.read()
+        entry = manifest.get(path)
+        built_path = os.path.join(DIST_DIR, entry['path']) if entry else None
+        if entry and entry['source_hash'] == _sha256(source) and os.path.exists(built_path):
+            fresh[path] = entry
+        else:
+            fresh[path] = build_asset(path, source)
+    if fresh != manifest:
+        _write_atomic(MANIFEST_PATH, json.dumps(fresh, indent=2, sort_keys=True).encode())
+    return fresh
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def manifest():
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = build()
+    return _manifest
+
+
+def asset_url(path):
+    """URL of the fingerprinted copy of static/<path>, or the plain static URL for anything else."""
+    entry = manifest().get(path)
+    if entry is None:
+        return url_for('static', filename=path)
+    return url_for('asset', filename=entry['path'])
+
+
+def serve_asset(filename):
+    path = safe_join(DIST_DIR, filename)
+    if path is None or filename.endswith('.json') or not os.path.isfile(path):
+        abort(404)
+    available = [e for e in compression.encodings() if os.path.isfile(path + SUFFIXES[e])]
+    encoding = compression.negotiate(request.accept_encodings, available)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = send_file(path + SUFFIXES[encoding] if encoding else path, mimetype=mimetype, conditional=True,
+                         max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    return response
+
+
+def init_app(app):
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.add_template_global(asset_url)
@@ -0,0 +1,194 @@
+"""Compare the compiled genre classifier in genres.py with the old nested-loop version.
+
+    python benchmarks/bench_genres.py [--subjects 300] [--books 500]
+
+Both versions are run over the same synthetic subject lists (OpenLibrary works
+easily carry hundreds of subjects) and must agree on every book. The batch
+categorize_genres and a single alternation regex over all keywords are timed
+on the same lists; the regex is only there to show why genres.py doesn't use one.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from functools import cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import genres  # noqa: E402
+
+FILLER_SUBJECTS = [
+    'accessible book', 'protected daisy', 'in library', 'open library staff picks', 'large type books',
+    'man-woman relationships', 'new york (n.y.)', 'families', 'friendship', 'english language',
+    'reading level-grade 11', 'american literature', 'women', 'translations into dutch', 'nyt:combined-print',
+    'sisters', 'fathers and daughters', 'small towns', 'city and town life', 'brothers and sisters',
+]
+
+
+def legacy_categorize_genre(raw_subjects):
+    """categorize_genre as it was before genres.py, minus the prints."""
+    if not raw_subjects:
+        return 'Fiction'
+
+    filtered_subjects = []
+    for sub in raw_subjects:
+        if isinstance(sub, str):
+            cleaned = sub.strip().lower()
+            if cleaned not in genres.IGNORE_LIST:
+                filtered_subjects.append(cleaned)
+
+    for genre, keywords in genres.GENRE_MAPPING.items():
+        for keyword in keywords:
+            for subject in filtered_subjects:
+                if keyword.lower() in subject:
+                    return genre
+
+    for subject in filtered_subjects:
+        if subject and subject not in genres.IGNORE_LIST:
+            cleaned = subject.replace('_', ' ').title()
+            if len(cleaned) < 30:
+                return cleaned
+
+    return 'Fiction'
+
+
+class AlternationClassifier:
+    """The keyword table compiled into one regex; the hit with the lowest table index wins."""
+
+    def __init__(self, classifier):
+        self.table = classifier.table
+        self.priority = {keyword: index for index, (keyword, _) in enumerate(self.table)}
+        # A lookahead, so a keyword that starts inside another keyword's match is still seen
+        keywords = sorted(self.priority, key=len, reverse=True)
+        self.pattern = re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))')
+
+    def best_index(self, text):
+        best = None
+        for match in self.pattern.finditer(text):
+            index = self.priority[match.group(1)]
+            if best is None or index < best:
+                best = index
+                if index == 0:
+                    break
+        return best
+
+
+def regex_categorize_genre(raw_subjects, classifier=None):
+    """categorize_genre with the alternation regex in place of the keyword table."""
+    if not raw_subjects:
+        return 'Fiction'
+    classifier = classifier or alternation_classifier()
+    filtered_subjects = genres.filter_subjects(raw_subjects)
+    best = classifier.best_index('\n'.join(filtered_subjects))
+    if best is not None:
+        return classifier.table[best][1]
+    for subject in filtered_subjects:
+        cleaned = subject.replace('_', ' ').title()
+        if subject and len(cleaned) < 30:
+            return cleaned
+    return 'Fiction'
+
+
+@cache
+def alternation_classifier():
+    return AlternationClassifier(genres.genre_classifier())
+
+
+def synthetic_subject_lists(books, subjects_per_book, seed=42):
+    rng = random.Random(seed)
+    keywords = [k for words in genres.GENRE_MAPPING.values() for k in words]
+    subject_lists = []
+    for _ in range(books):
+        subjects = [f"{rng.choice(FILLER_SUBJECTS)} {rng.randint(1, 10_000)}" for _ in range(subjects_per_book)]
+        # Most works carry a handful of genre-ish subjects somewhere in the list
+        for _ in range(rng.randint(0, 3)):
+            subjects.insert(rng.randrange(len(subjects) + 1), f"{rng.choice(keywords)} -- fiction")
+        subject_lists.append(subjects)
+    return subject_lists
+
+
+def timed(fn, subject_lists):
+    start = time.perf_counter()
+    result = [fn(subjects) for subjects in subject_lists]
+    return result, time.perf_counter() - start
+
+
+def timed_batch(fn, subject_lists):
+    start = time.perf_counter()
+    result = fn(subject_lists)
+    return result, time.perf_counter() - start
+
+
+def micro_benchmarks(books=500, subjects=300, repeat=3):
+    """Best-of-`repeat` microseconds per call for the genre helpers, as a dict for benchmarks/run.py."""
+    subject_lists = synthetic_subject_lists(books, subjects)
+    # Google Books hands back one to three categories, which is where batching saves the most
+    category_lists = synthetic_subject_lists(books, 2, seed=7)
+    stored_genres = [f"Fiction / {genre} / General" for genre in genres.GENRE_MAPPING] * max(1, books // 10)
+
+    def per_call(fn, calls, cold=False):
+        times = []
+        for _ in range(repeat):
+            if cold:
+                genres._clean_genre.cache_clear()
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times) / calls * 1e6
+
+    def clean_all():
+        for genre in stored_genres:
+            genres.clean_genre([genre])
+
+    alternation_classifier()
+    return {
+        'books': books,
+        'subjects_per_book': subjects,
+        'categorize_genre_us': per_call(lambda: timed(genres.categorize_genre, subject_lists), books),
+        'categorize_genres_batch_us': per_call(lambda: genres.categorize_genres(subject_lists), books),
+        'categorize_genre_regex_us': per_call(lambda: timed(regex_categorize_genre, subject_lists), books),
+        'categories_genre_us': per_call(lambda: timed(genres.categorize_genre, category_lists), books),
+        'categories_genres_batch_us': per_call(lambda: genres.categorize_genres(category_lists), books),
+        'clean_genres_batch_us': per_call(lambda: genres.clean_genres([[genre] for genre in stored_genres]),
+                                          len(stored_genres)),
+        'clean_genre_cold_us': per_call(clean_all, len(stored_genres), cold=True),
+        'clean_genre_warm_us': per_call(clean_all, len(stored_genres)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subjects', type=int, default=300, help='subjects per book')
+    parser.add_argument('--books', type=int, default=500)
+    args = parser.parse_args()
+
+    subject_lists = synthetic_subject_lists(args.books, args.subjects)
+    legacy, legacy_time = timed(legacy_categorize_genre, subject_lists)
+    compiled, compiled_time = timed(genres.categorize_genre, subject_lists)
+    batch, batch_time = timed_batch(genres.categorize_genres, subject_lists)
+    alternation_classifier()
+    regex, regex_time = timed(regex_categorize_genre, subject_lists)
+
+    mismatches = sum(1 for a, b, c in zip(legacy, compiled, batch) if not a == b == c)
+    regex_mismatches = sum(1 for a, b in zip(legacy, regex) if a != b)
+    print(f"{args.books} books x {args.subjects} subjects")
+    print(f"  legacy loops:      {legacy_time * 1000:8.1f} ms")
+    print(f"  compiled table:    {compiled_time * 1000:8.1f} ms  ({legacy_time / compiled_time:.1f}x)")
+    print(f"  batch (one pass):  {batch_time * 1000:8.1f} ms  ({legacy_time / batch_time:.1f}x)")
+    print(f"  alternation regex: {regex_time * 1000:8.1f} ms  ({legacy_time / regex_time:.1f}x, "
+          f"{regex_mismatches} mismatches)")
+    print(f"  mismatches:        {mismatches}")
+
+    category_lists = synthetic_subject_lists(args.books, 2, seed=7)
+    _, short_time = timed(genres.categorize_genre, category_lists)
+    _, short_batch_time = timed_batch(genres.categorize_genres, category_lists)
+    print(f"{args.books} books x 2 categories (Google Books)")
+    print(f"  compiled table:    {short_time * 1000:8.1f} ms")
+    print(f"  batch (one pass):  {short_batch_time * 1000:8.1f} ms  ({short_time / short_batch_time:.1f}x)")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Route latency and throughput for one synthetic library size, through the Flask test client.
+
+    python benchmarks/bench_routes.py --size 100000 [--requests 50] [--latency 0.05]
+
+Writes a JSON object with per-route latency percentiles, requests per
+second, SQL statements and peak Python allocations per request to --output.
+The library is generated once per size and seed under benchmarks/.data and
+reused by later runs; the API, page and cover caches and the OpenLibrary
+dump index point at empty temporary locations so every run starts cold.
+benchmarks/run.py runs this for several sizes and writes the combined
+results.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'benchmarks', '.data')
+sys.path.insert(0, ROOT)
+
+WARMUP = 2
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(client, urls, warmup=2):
+    """Request each URL in turn; the first `warmup` are not timed and the last one is traced for memory."""
+    for url in urls[:warmup]:
+        client.get(url)
+    urls, traced_url = urls[warmup:-1], urls[-1]
+    latencies = []
+    queries = []
+    statuses = set()
+    started_at = time.perf_counter()
+    for url in urls:
+        t = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - t)
+        statuses.add(response.status_code)
+        match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+        if match:
+            queries.append(int(match.group(1)))
+    elapsed = time.perf_counter() - started_at
+
+    # One more request under tracemalloc, which is too slow to leave on for the timed ones
+    tracemalloc.start()
+    client.get(traced_url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'requests': len(urls),
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'rps': len(urls) / elapsed,
+        'sql_per_request': statistics.mean(queries) if queries else None,
+        'peak_kib': peak / 1024,
+        'statuses': sorted(statuses),
+    }
+
+
+def library_path(size, seed):
+    return os.path.join(DATA_DIR, f"library-{size}-{seed}.db")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1000, help='books in the synthetic library')
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub API latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='extra random stub API latency in seconds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='-', help='where to write the JSON results, - for stdout')
+    args = parser.parse_args()
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix='bench-routes-')
+    source = library_path(args.size, args.seed)
+    database = os.path.join(work_dir, 'books.db')
+
+    # main.py reads its configuration at import time
+    os.environ.update({
+        'DB_URI': f"sqlite:///{database}",
+        'API_CACHE_PATH': os.path.join(work_dir, 'api_cache.db'),
+        'PAGE_CACHE_PATH': os.path.join(work_dir, 'page_cache.db'),
+        'COVER_DIR': os.path.join(work_dir, 'covers'),
+        'OL_INDEX_PATH': os.path.join(work_dir, 'missing-ol-index.db'),
+        'IMPORT_DIR': os.path.join(work_dir, 'imports'),
+        'OPENLIBRARY_RATE_LIMIT': '0',
+        'GOOGLE_BOOKS_RATE_LIMIT': '0',
+        'SECRET_KEY': 'benchmark',
+    })
+    if os.path.exists(source):
+        shutil.copyfile(source, database)
+
+    import http_client
+    import main as app_module
+    from benchmarks import library
+    from benchmarks.stub_api import StubAPI
+
+    app = app_module.create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        app_module.upgrade_schema()
+
+    generation_seconds = None
+    if not os.path.exists(source):
+        t = time.perf_counter()
+        library.populate(app_module, app, args.size, seed=args.seed)
+        generation_seconds = time.perf_counter() - t
+        shutil.copyfile(database, source)
+
+    stub = StubAPI(latency=args.latency, jitter=args.jitter).start()
+    stub.install(http_client.get_session())
+    client = app.test_client()
+
+    with app.app_context():
+        max_id = app_module.db.session.execute(app_module.db.select(app_module.func.max(app_module.Book.id))).scalar()
+    rng = random.Random(args.seed)
+    n = WARMUP + args.requests + 1
+    run_id = f"{int(time.time())}{os.getpid()}"
+
+    routes = {
+        'home': ['/'] * n,
+        'top_books': ['/top-books'] * n,
+        'tbr': ['/tbr'] * n,
+        'stats': ['/stats'] * n,
+        'book_detail': [f"/book/{rng.randint(1, max_id)}" for _ in range(n)],
+        # Every find adds a new book, so every request needs a work nobody has added yet
+        'find': [f"/find/tbr?id=OL{run_id}{i}W" for i in range(n)],
+    }
+    results = {}
+    for name, urls in routes.items():
+        results[name] = measure(client, urls, warmup=WARMUP)
+        print(f"{name:12} p50 {results[name]['p50_ms']:8.1f} ms  p95 {results[name]['p95_ms']:8.1f} ms  "
+              f"{results[name]['rps']:8.1f} req/s  peak {results[name]['peak_kib']:9.0f} KiB", file=sys.stderr)
+
+    # Let the enrichment jobs started by find finish before the temp dir goes away
+    app_module.job_pool.shutdown(wait=True)
+    stub.stop()
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = {
+        'size': args.size,
+        'seed': args.seed,
+        'api_latency': args.latency,
+        'api_jitter': args.jitter,
+        'api_requests': stub.requests,
+        'generation_seconds': generation_seconds,
+        'routes': results,
+    }
+    if args.output == '-':
+        json.dump(output, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Worker startup time: importing main.py, building the app and serving the first request.
+
+    python benchmarks/bench_startup.py [--runs 10]
+
+Every run is a fresh Python process, like a newly booted worker, against an
+already upgraded database and cold API and page caches. Writes the median of
+each phase to --output: import_ms, create_app_ms, first_request_ms, and
+ready_ms from starting the process to the first response.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUP = """
+import main
+app = main.create_app()
+with app.app_context():
+    main.upgrade_schema()
+"""
+
+WORKER = """
+import time
+started_at = time.perf_counter()
+import json
+import main
+imported_at = time.perf_counter()
+app = main.create_app()
+created_at = time.perf_counter()
+status = app.test_client().get('/').status_code
+served_at = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported_at - started_at) * 1000,
+    'create_app_ms': (created_at - imported_at) * 1000,
+    'first_request_ms': (served_at - created_at) * 1000,
+    'served_at': time.time(),
+    'status': status,
+}))
+"""
+
+
+def run(code, env):
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True,
+                          check=True).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', default='-', help='where to write the JSON results, - for stdout')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ,
+               DB_URI=f"sqlite:///{os.path.join(work_dir, 'books.db')}",
+               API_CACHE_PATH=os.path.join(work_dir, 'api_cache.db'),
+               COVER_DIR=os.path.join(work_dir, 'covers'),
+               OL_INDEX_PATH=os.path.join(work_dir, 'missing-ol-index.db'),
+               IMPORT_DIR=os.path.join(work_dir, 'imports'),
+               SECRET_KEY='benchmark')
+    try:
+        run(SETUP, env)
+        runs = []
+        for i in range(args.runs):
+            # A fresh page cache every time, so the first request really renders
+            env['PAGE_CACHE_PATH'] = os.path.join(work_dir, f"page_cache-{i}.db")
+            spawned_at = time.time()
+            result = json.loads(run(WORKER, env).splitlines()[-1])
+            result['ready_ms'] = (result.pop('served_at') - spawned_at) * 1000
+            runs.append(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = {name: statistics.median(r[name] for r in runs)
+              for name in ('import_ms', 'create_app_ms', 'first_request_ms', 'ready_ms')}
+    output['runs'] = args.runs
+    output['statuses'] = sorted({r['status'] for r in runs})
+    print(f"import {output['import_ms']:.0f} ms  create_app {output['create_app_ms']:.1f} ms  "
+          f"first request {output['first_request_ms']:.0f} ms  ready {output['ready_ms']:.0f} ms", file=sys.stderr)
+
+    if args.output == '-':
+        json.dump(output, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
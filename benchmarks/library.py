@@ -0,0 +1,106 @@
+"""Synthetic Book libraries for the benchmarks.
+
+The mix roughly follows a real reading log: most books finished, with finish
+dates bunched towards the present; a few currently reading; a TBR pile;
+ratings skewed towards the top of the scale; and descriptions of very mixed
+length.
+"""
+import random
+from datetime import date, timedelta
+
+GENRE_WEIGHTS = {
+    'Romance': 18, 'Fantasy': 20, 'Science Fiction': 8, 'Mystery': 9, 'Thriller': 10, 'Horror': 4,
+    'Historical Fiction': 6, 'Young Adult': 7, 'Biography': 3, 'Self-Help': 2, 'Non-Fiction': 5,
+    'Literary Fiction': 5, 'Adventure': 2, 'Children': 1,
+}
+SPICY_GENRES = {'Romance', 'Fantasy'}
+STAR_RATINGS = [1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5]
+STAR_WEIGHTS = [1, 1, 2, 3, 8, 12, 22, 20, 18]
+
+TITLE_WORDS = [
+    'shadow', 'crown', 'house', 'river', 'night', 'garden', 'storm', 'queen', 'secret', 'fire', 'silver',
+    'winter', 'heart', 'city', 'bone', 'glass', 'wolf', 'song', 'ember', 'sea', 'star', 'promise', 'lie',
+]
+FIRST_NAMES = ['Sarah', 'Rebecca', 'Ali', 'Emily', 'Colleen', 'Taylor', 'Stephen', 'Leigh', 'Brandon', 'Freida']
+LAST_NAMES = ['Maas', 'Yarros', 'Hazelwood', 'Henry', 'Hoover', 'Jenkins Reid', 'King', 'Bardugo', 'Sanderson']
+SENTENCES = [
+    'A sweeping story of love, loss and the choices that define us.',
+    'When the unthinkable happens, she has to decide who she can trust.',
+    'Set against the backdrop of a kingdom on the brink of war.',
+    'An unforgettable journey through grief, friendship and second chances.',
+    'The number one bestseller that readers cannot stop talking about.',
+    'Nothing is what it seems in this twisty, page-turning thriller.',
+    'Two rivals are forced to work together, and sparks fly.',
+    'Magic has a price, and someone always has to pay it.',
+    'A small town hides a big secret that has waited decades to come out.',
+    'Told in alternating timelines, this is a novel about the stories we inherit.',
+]
+
+
+def book_rows(count, seed=42, today=None):
+    """Yield `count` dicts of Book column values."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    genres = list(GENRE_WEIGHTS)
+    genre_weights = list(GENRE_WEIGHTS.values())
+
+    for i in range(count):
+        genre = rng.choices(genres, genre_weights)[0] if rng.random() < 0.95 else None
+        pages = max(60, int(rng.gauss(370, 130))) if rng.random() < 0.95 else None
+        shelf = rng.random()
+        date_started = date_finished = None
+        star_rating = spice_rating = review = None
+        if shelf < 0.80:
+            # Finished: recent years are much better represented than ten years ago
+            date_finished = today - timedelta(days=min(int(rng.expovariate(1 / 700)), 3650))
+            date_started = date_finished - timedelta(days=int((pages or 300) / rng.uniform(20, 80)))
+            if rng.random() < 0.9:
+                star_rating = rng.choices(STAR_RATINGS, STAR_WEIGHTS)[0]
+            if genre in SPICY_GENRES and rng.random() < 0.7:
+                spice_rating = rng.randint(0, 5)
+            if rng.random() < 0.3:
+                review = ' '.join(rng.sample(SENTENCES, 2))[:250]
+        elif shelf < 0.85:
+            date_started = today - timedelta(days=rng.randint(0, 30))
+
+        description = None
+        if rng.random() < 0.85:
+            sentences = max(1, int(rng.lognormvariate(1.8, 0.7)))
+            description = ' '.join(rng.choice(SENTENCES) for _ in range(sentences))
+
+        yield {
+            'title': f"{rng.choice(TITLE_WORDS).title()} of {rng.choice(TITLE_WORDS).title()} {i}",
+            'author': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'year': min(today.year, int(rng.triangular(1950, today.year, today.year))),
+            'star_rating': star_rating,
+            'spice_rating': spice_rating,
+            'review': review,
+            'img_url': f"https://covers.openlibrary.org/b/id/{rng.randint(1, 14_000_000)}-L.jpg"
+            if rng.random() < 0.9 else None,
+            'date_started': date_started,
+            'date_finished': date_finished,
+            'pages': pages,
+            'genre': genre,
+            'description': description,
+        }
+
+
+def populate(app_module, app, count, seed=42, chunk_size=10_000):
+    """Bulk insert a synthetic library into the app's database and rebuild the stats rollup."""
+    from sqlalchemy import insert
+
+    db, Book = app_module.db, app_module.Book
+    with app.app_context():
+        chunk = []
+        for row in book_rows(count, seed):
+            # Bulk inserts skip the mapper events that normally fill this in
+            row['match_key'] = app_module.library_key(row['title'], row['author'])
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                db.session.execute(insert(Book), chunk)
+                chunk = []
+        if chunk:
+            db.session.execute(insert(Book), chunk)
+        db.session.commit()
+        # Likewise for the ORM flush that normally keeps the rollup current
+        app_module.rebuild_stats()
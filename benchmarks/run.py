@@ -0,0 +1,136 @@
+"""Run the whole benchmark suite and write one JSON file per run.
+
+    python benchmarks/run.py [--sizes 1000,100000] [--requests 50] [--latency 0.05]
+    python benchmarks/run.py --compare benchmarks/results/abc1234.json
+
+Each library size runs in its own process (main.py reads its configuration
+at import), then worker startup is timed in fresh processes, then the genre
+micro-benchmarks run in this one. Results go to
+benchmarks/results/<commit>.json unless --output says otherwise. With
+--compare, every figure is printed next to the same figure from an earlier
+results file, so two commits can be compared on the same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import bench_genres  # noqa: E402
+
+# Lower is better for every figure except these
+HIGHER_IS_BETTER = {'rps'}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f"{commit}-dirty" if dirty else commit
+
+
+def run_size(size, args):
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        output = f.name
+    try:
+        subprocess.run([
+            sys.executable, os.path.join(ROOT, 'benchmarks', 'bench_routes.py'),
+            '--size', str(size), '--requests', str(args.requests), '--latency', str(args.latency),
+            '--jitter', str(args.jitter), '--seed', str(args.seed), '--output', output,
+        ], check=True, stdout=subprocess.DEVNULL)
+        with open(output) as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+
+def run_startup(args):
+    output = subprocess.run([
+        sys.executable, os.path.join(ROOT, 'benchmarks', 'bench_startup.py'), '--runs', str(args.startup_runs),
+    ], check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def flatten(results):
+    """{'routes.1000.home.p50_ms': 12.3, ...} for the numbers in a results file."""
+    figures = {}
+    for size, run in results.get('routes', {}).items():
+        for route, numbers in run['routes'].items():
+            for name, value in numbers.items():
+                if isinstance(value, (int, float)) and name != 'requests':
+                    figures[f"routes.{size}.{route}.{name}"] = value
+    for name, value in results.get('startup', {}).items():
+        if name.endswith('_ms'):
+            figures[f"startup.{name}"] = value
+    for name, value in results.get('genres', {}).items():
+        if name.endswith('_us'):
+            figures[f"genres.{name}"] = value
+    return figures
+
+
+def compare(current, baseline):
+    before, after = flatten(baseline), flatten(current)
+    print(f"{'':45} {baseline.get('commit', 'baseline'):>12} {current.get('commit', 'current'):>12}   change")
+    for name in sorted(after):
+        if name not in before or not before[name]:
+            continue
+        change = (after[name] - before[name]) / before[name] * 100
+        better = change > 0 if name.rsplit('.', 1)[-1] in HIGHER_IS_BETTER else change < 0
+        marker = '' if abs(change) < 5 else (' better' if better else ' WORSE')
+        print(f"{name:45} {before[name]:12.2f} {after[name]:12.2f} {change:+8.1f}%{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000', help='comma separated library sizes, e.g. 1000,100000,1000000')
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub API latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='extra random stub API latency in seconds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='results file, default benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier results file to compare against')
+    parser.add_argument('--startup-runs', type=int, default=10, help='fresh processes timed for worker startup')
+    parser.add_argument('--skip-routes', action='store_true', help='skip the route benchmarks')
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'routes': {},
+    }
+    if not args.skip_routes:
+        for size in (int(s) for s in args.sizes.split(',') if s):
+            print(f"Library of {size} books", file=sys.stderr)
+            results['routes'][str(size)] = run_size(size, args)
+    print("Worker startup", file=sys.stderr)
+    results['startup'] = run_startup(args)
+    print("Genre micro-benchmarks", file=sys.stderr)
+    results['genres'] = bench_genres.micro_benchmarks()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
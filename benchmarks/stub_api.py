@@ -0,0 +1,173 @@
+"""Local stand-in for the OpenLibrary and Google Books endpoints the app calls.
+
+    server = StubAPI(latency=0.08, jitter=0.04).start()
+    server.install(http_client.get_session())
+
+install() mounts an adapter on the app's requests session that sends every
+openlibrary.org / googleapis.com URL to the stub instead, so main.py runs
+unchanged. Each response waits latency + uniform(0, jitter) seconds first.
+inject() makes the next few requests slower still or answer with an error
+status, for testing timeouts, retries and circuit breakers. Cover images
+(/b/...) are small generated JPEGs, one colour per cover ID.
+"""
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+SUBJECTS = [
+    ['Fantasy fiction', 'Dragons', 'Magic', 'Accessible book'],
+    ['Romance', 'Love stories', 'Man-woman relationships'],
+    ['Thriller', 'Suspense', 'Psychological fiction'],
+    ['Science fiction', 'Space opera', 'Robots'],
+    ['Fiction', 'Families', 'Small towns'],
+]
+HOSTS = ['https://openlibrary.org', 'https://covers.openlibrary.org', 'https://www.googleapis.com']
+
+
+def _number(text, modulo):
+    return int(hashlib.sha256(text.encode()).hexdigest()[:8], 16) % modulo
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        with server.lock:
+            server.requests += 1
+            fault = next((f for f in server.faults if f['remaining'] and url.path.startswith(f['path'])), None)
+            if fault:
+                fault['remaining'] -= 1
+        time.sleep(server.latency + random.uniform(0, server.jitter) + (fault['delay'] if fault else 0))
+        if fault and fault['status']:
+            self.send_response(fault['status'])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        headers = {}
+        if path == '/search.json':
+            body = self.search(query.get('q', ''), int(query.get('limit', 10)))
+        elif path.startswith('/works/'):
+            key = path.rsplit('/', 1)[-1].removesuffix('.json')
+            # Works never change here, so a conditional GET with the ETag we handed out is always a 304
+            headers = {'ETag': f'"{key}-1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                self.send_response(304)
+                self.send_header('ETag', headers['ETag'])
+                self.end_headers()
+                return
+            body = {'key': f"/works/{key}", 'subjects': SUBJECTS[_number(key, len(SUBJECTS))],
+                    'description': {'type': '/type/text', 'value': f"Stub description of {key}."}}
+        elif path.startswith('/books/v1/volumes'):
+            body = {'items': [{'volumeInfo': {'pageCount': 320, 'description': 'Stub volume.',
+                                              'categories': ['Fiction / Fantasy / Epic']}}]}
+        elif path.startswith('/books/'):
+            key = path.rsplit('/', 1)[-1].removesuffix('.json')
+            body = {'key': f"/books/{key}", 'number_of_pages': 150 + _number(key, 600)}
+        elif path.startswith('/b/'):
+            data = self.cover(path.rsplit('/', 1)[-1])
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def cover(name):
+        """A cover-shaped JPEG whose colour depends on the name, e.g. '123-L.jpg'."""
+        from PIL import Image
+
+        colour = tuple(_number(f"{name}{channel}", 256) for channel in 'rgb')
+        out = io.BytesIO()
+        Image.new('RGB', (600, 900), colour).save(out, format='JPEG')
+        return out.getvalue()
+
+    @staticmethod
+    def search(q, limit):
+        # A search for an OLID finds that work, anything else gets a few made-up works
+        olid = q.upper() if q.upper().startswith('OL') else None
+        keys = [olid] if olid else [f"OL{_number(f'{q}{i}', 10 ** 7)}W" for i in range(min(limit, 5))]
+        docs = [{
+            'key': f"/works/{key}",
+            'title': f"Stub Book {key}",
+            'author_name': ['Stub Author'],
+            'first_publish_year': 1990 + _number(key, 35),
+            'edition_key': [f"{key[:-1]}M", f"{key[:-1]}1M"],
+        } for key in keys]
+        return {'numFound': len(docs), 'docs': docs}
+
+
+class RedirectAdapter(HTTPAdapter):
+    """Sends requests for the real API hosts to the stub server."""
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = f"{self.base_url}{url.path}" + (f"?{url.query}" if url.query else '')
+        return super().send(request, **kwargs)
+
+
+class StubAPI:
+    def __init__(self, latency=0.05, jitter=0.0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.jitter = jitter
+        self.server.requests = 0
+        self.server.faults = []
+        self.server.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def inject(self, count, status=None, delay=0.0, path='/'):
+        """Make the next `count` requests under `path` wait `delay` more seconds and, given a status, fail with it."""
+        with self.server.lock:
+            self.server.faults.append({'remaining': count, 'status': status, 'delay': delay, 'path': path})
+        return self
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def install(self, session):
+        adapter = RedirectAdapter(self.base_url, pool_maxsize=32)
+        for host in HOSTS:
+            session.mount(host, adapter)
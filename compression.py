@@ -0,0 +1,70 @@
+"""gzip / brotli for the responses the app renders, and for the precompressed static assets.
+
+Brotli is used when the brotli package is installed and the client accepts
+it, gzip otherwise. Streamed responses (exports) and files sent from disk
+pass through untouched: the disk ones are either already compressed (cover
+JPEGs) or have precompressed variants (see assets.py).
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies aren't worth a Content-Encoding header and the CPU
+MIN_SIZE = 500
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'text/plain', 'text/csv', 'application/json',
+                      'application/javascript', 'text/javascript', 'image/svg+xml'}
+# Per response we favour speed; build time assets get the best ratio
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def encodings():
+    """Encodings we can produce, best first."""
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    # A fixed mtime keeps the output, and so the precompressed files, identical between builds
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def negotiate(accept_encodings, available=None):
+    """The best encoding in `available` (default: everything we can produce) the client accepts, or None."""
+    for encoding in available if available is not None else encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress_response(response, request):
+    """after_request hook: compress a rendered response if the client and the content allow it."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding, DYNAMIC_LEVELS[encoding]))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the ones a strong ETag promised
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    from flask import request
+
+    @app.after_request
+    def compress_rendered(response):
+        return compress_response(response, request)
@@ -0,0 +1,125 @@
+"""Local copies of book covers, resized once and kept in a content-addressed cache on disk.
+
+Layout of COVER_DIR:
+    sources/<sha256 of the cover URL>     -> sha256 of the image bytes it returned
+    <content sha256>-<size>.jpg           -> resized variant of those bytes
+
+Covers that come back identical from different URLs share their variants.
+"""
+import hashlib
+import io
+import os
+import threading
+
+import http_client
+
+COVER_DIR = os.environ.get('COVER_DIR', 'covers_cache')
+COVER_CACHE_MAX_BYTES = int(os.environ.get('COVER_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+COVER_TIMEOUT = 10
+
+# Bounding boxes in pixels: thumb for small lists, medium for the flip cards, large for the detail page
+SIZES = {
+    'thumb': (100, 150),
+    'medium': (300, 450),
+    'large': (500, 750),
+}
+
+_eviction_lock = threading.Lock()
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def url_version(url):
+    """Short fingerprint of a cover URL, used to bust browser caches when a book's cover changes."""
+    return _sha256(url.encode())[:10]
+
+
+def resize(data, size):
+    from PIL import Image  # only needed once a cover is actually fetched, and slow to import
+
+    image = Image.open(io.BytesIO(data))
+    image = image.convert('RGB')
+    image.thumbnail(SIZES[size])
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=85, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def content_hash_for(url):
+    """Hash of the image behind url, downloading it the first time we see the URL. None if it can't be fetched."""
+    source_path = os.path.join(COVER_DIR, 'sources', _sha256(url.encode()))
+    if os.path.exists(source_path):
+        with open(source_path) as f:
+            return f.read().strip()
+
+    try:
+        response = http_client.fetch(url, timeout=COVER_TIMEOUT)
+    except Exception as e:
+        print(f"Error fetching cover {url}: {e}")
+        return None
+    if response.status_code != 200 or not response.content:
+        return None
+
+    content_hash = _sha256(response.content)
+    os.makedirs(os.path.dirname(source_path), exist_ok=True)
+    for size in SIZES:
+        variant_path = os.path.join(COVER_DIR, f"{content_hash}-{size}.jpg")
+        if not os.path.exists(variant_path):
+            try:
+                _write_atomic(variant_path, resize(response.content, size))
+            except Exception as e:
+                print(f"Error resizing cover {url}: {e}")
+                return None
+    _write_atomic(source_path, content_hash.encode())
+    evict()
+    return content_hash
+
+
+def get_variant(url, size):
+    """Return (path, etag) of a resized cover, or None if the original can't be fetched."""
+    content_hash = content_hash_for(url)
+    if content_hash is None:
+        return None
+    path = os.path.join(COVER_DIR, f"{content_hash}-{size}.jpg")
+    if not os.path.exists(path):
+        # Evicted since we first saw the URL, start over
+        try:
+            os.remove(os.path.join(COVER_DIR, 'sources', _sha256(url.encode())))
+        except FileNotFoundError:
+            pass
+        content_hash = content_hash_for(url)
+        if content_hash is None:
+            return None
+        path = os.path.join(COVER_DIR, f"{content_hash}-{size}.jpg")
+    # Keep track of use for the LRU eviction below
+    os.utime(path)
+    return path, f"{content_hash[:16]}-{size}"
+
+
+def evict(max_bytes=None):
+    """Delete the least recently served variants until the cache fits in max_bytes."""
+    max_bytes = COVER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _eviction_lock:
+        variants = []
+        for entry in os.scandir(COVER_DIR):
+            if entry.is_file() and entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                variants.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in variants)
+        for _, size, path in sorted(variants):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,126 @@
+"""Streaming library exports: CSV, JSON Lines and, with pyarrow installed, Parquet.
+
+Every writer takes the column names and an iterable of row chunks and yields
+bytes as it goes, so the export route can send them as a chunked response
+and the CLI can write them to a file while only one chunk of rows is in
+memory at a time.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+# Parquet readers work best with row groups much bigger than a query chunk
+PARQUET_ROW_GROUP_SIZE = 20_000
+PARQUET_COMPRESSION = 'zstd'
+
+
+def available(fmt):
+    if fmt != 'parquet':
+        return fmt in FORMATS
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def write(fmt, fields, chunks):
+    """Bytes of the export in `fmt`. `fields` is a list of (name, python type) pairs in row order."""
+    if fmt == 'csv':
+        return csv_chunks([name for name, _ in fields], chunks)
+    if fmt == 'jsonl':
+        return jsonl_chunks([name for name, _ in fields], chunks)
+    if fmt == 'parquet':
+        return parquet_chunks(fields, chunks)
+    raise ValueError(f"Unknown export format {fmt!r}")
+
+
+def csv_chunks(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # An empty library still gets its header row
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def jsonl_chunks(columns, chunks):
+    for rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), default=_json_value, ensure_ascii=False) + '\n' for row in rows
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands over what was written since the last take().
+
+    The Parquet footer stores absolute offsets, so tell() has to keep counting
+    across takes, which rules out simply truncating a BytesIO.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pending = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.pending.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.pending)
+        self.pending = []
+        return data
+
+
+def parquet_chunks(fields, chunks, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {int: pa.int64(), float: pa.float64(), str: pa.string(), date: pa.date32(),
+                   datetime: pa.timestamp('us')}
+    schema = pa.schema([(name, arrow_types[python_type]) for name, python_type in fields])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression=PARQUET_COMPRESSION)
+
+    def write_row_group(rows):
+        columns = zip(*rows)
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        ))
+
+    pending = []
+    for rows in chunks:
+        pending.extend(rows)
+        if len(pending) >= row_group_size:
+            write_row_group(pending)
+            pending = []
+            yield sink.take()
+    if pending:
+        write_row_group(pending)
+    writer.close()
+    yield sink.take()
@@ -0,0 +1,270 @@
+"""Mapping OpenLibrary subjects and Google Books categories onto the genres we show.
+
+The keyword tables are flattened once, on first use, into a single tuple in
+priority order. Classifying joins the subjects into one text and checks each
+keyword against it, which keeps the old first-match order but replaces the
+genre x keyword x subject Python loop with one substring search per keyword.
+categorize_genres and clean_genres do the same for a whole batch at once: the
+texts are joined into one corpus and each keyword is searched for once across
+all of them, so a bulk run makes a few hundred str.find calls in total instead
+of a few hundred per book.
+
+The table is deliberately not compiled into a single alternation regex or an
+Aho-Corasick automaton, which is what the original request asked for. With
+the stdlib re module an alternation of all keywords (lowest priority index
+picked from finditer) measured around 50x slower than the str.find loop, and
+even a trie-shaped pattern was over 10x slower; there is no automaton in the
+stdlib. benchmarks/bench_genres.py prints the alternation numbers next to the
+table's so this can be re-checked.
+"""
+import logging
+from bisect import bisect_right
+from functools import cache, lru_cache
+
+logger = logging.getLogger(__name__)
+
+IGNORE_LIST = ['fiction', 'books', 'literature', 'english', 'new york times bestseller', 'Serie:gods of the game']
+
+# Order matters: the first genre (and within it the first keyword) that matches wins
+GENRE_MAPPING = {
+    'Romance': [
+        'romance', 'love story', 'romantic', 'love stories', 'contemporary romance',
+        'historical romance', 'romantic fiction', 'love', 'relationships', 'sports', 'game'
+    ],
+    'Fantasy': [
+        'fantasy', 'fantasy fiction', 'magic', 'magical', 'dragons', 'wizards',
+        'elves', 'sword and sorcery', 'epic fantasy', 'urban fantasy', 'paranormal',
+        'high fantasy', 'dark fantasy', 'magical realism'
+    ],
+    'Science Fiction': [
+        'science fiction', 'sci-fi', 'science fiction & fantasy', 'space', 'aliens',
+        'future', 'dystopian', 'cyberpunk', 'time travel', 'robots', 'space opera',
+        'dystopian fiction', 'alternate history'
+    ],
+    'Mystery': [
+        'mystery', 'mystery & detective', 'detective', 'crime', 'murder',
+        'investigation', 'police', 'noir', 'cozy mystery', 'crime fiction',
+        'detective fiction', 'mystery fiction'
+    ],
+    'Thriller': [
+        'thriller', 'suspense', 'psychological thriller', 'action thriller',
+        'spy thriller', 'domestic thriller', 'legal thriller'
+    ],
+    'Horror': [
+        'horror', 'horror fiction', 'ghost', 'vampire', 'zombie', 'supernatural',
+        'gothic', 'occult', 'paranormal horror'
+    ],
+    'Historical Fiction': [
+        'historical fiction', 'historical', 'world war', 'civil war',
+        'medieval', 'victorian', 'ancient', 'period fiction', 'historical novel'
+    ],
+    'Young Adult': [
+        'young adult', 'ya', 'teen', 'coming of age', 'teenage', 'adolescent',
+        'young adult fiction', 'children\'s books', 'juvenile fiction'
+    ],
+    'Biography': [
+        'biography', 'autobiography', 'memoir', 'life story', 'biographical',
+        'personal narratives'
+    ],
+    'Self-Help': [
+        'self-help', 'personal development', 'motivation', 'psychology',
+        'business', 'productivity', 'success', 'self-improvement'
+    ],
+    'Non-Fiction': [
+        'nonfiction', 'non-fiction', 'history', 'politics', 'science', 'nature',
+        'travel', 'cooking', 'health', 'religion', 'philosophy', 'biography & autobiography'
+    ],
+    'Literary Fiction': [
+        'literary fiction', 'literature', 'classic', 'literary', 'classics',
+        'contemporary literature', 'modern literature'
+    ],
+    'Adventure': [
+        'adventure', 'action', 'survival', 'expedition', 'action & adventure'
+    ],
+    'Children': [
+        'children', 'juvenile', 'picture book', 'kids', 'children\'s literature',
+        'picture books', 'early readers'
+    ]
+}
+
+# Keywords clean_genre looks for in stored genres, in priority order
+CLEAN_GENRE_RULES = [
+    ('Fantasy', ['fantasy']),
+    ('Romance', ['romance']),
+    ('Thriller', ['thriller']),
+    ('Science Fiction', ['science fiction', 'sci-fi']),
+    ('Horror', ['horror']),
+    ('Young Adult', ['young adult', 'ya']),
+]
+TITLE_HINTS = [
+    ('Fantasy', ['dragon', 'sword', 'magic', 'kingdom', 'throne']),
+    ('Romance', ['love', 'kiss', 'heart', 'desire']),
+]
+
+
+class KeywordClassifier:
+    """First-match keyword lookup, compiled into one priority-ordered keyword table."""
+
+    def __init__(self, rules):
+        table = []
+        seen = set()
+        for label, keywords in rules:
+            for keyword in keywords:
+                keyword = keyword.lower()
+                # A keyword listed twice keeps its first (highest) priority
+                if keyword not in seen:
+                    seen.add(keyword)
+                    table.append((keyword, label))
+        self.table = tuple(table)
+
+    def best_match(self, text):
+        """Return (label, keyword, position) of the highest-priority keyword in text, or None."""
+        for keyword, label in self.table:
+            position = text.find(keyword)
+            if position != -1:
+                return label, keyword, position
+        return None
+
+    def best_matches(self, texts):
+        """best_match for each of texts, searching every keyword once across all of them joined together."""
+        matches = [None] * len(texts)
+        remaining = list(range(len(texts)))
+        corpus, starts = _join(texts, remaining)
+        unmatched = len(remaining)
+        for keyword, label in self.table:
+            position = corpus.find(keyword)
+            while position != -1:
+                slot = bisect_right(starts, position) - 1
+                index = remaining[slot]
+                if matches[index] is None:
+                    matches[index] = (label, keyword, position - starts[slot])
+                    unmatched -= 1
+                # Lower-priority hits in a text that already matched don't count, so skip to the next text
+                position = corpus.find(keyword, starts[slot + 1])
+            if not unmatched:
+                break
+            # Once half the texts have matched, leave them out of the corpus the later keywords search
+            if unmatched <= len(remaining) // 2:
+                remaining = [i for i in remaining if matches[i] is None]
+                corpus, starts = _join(texts, remaining)
+        return matches
+
+
+def _join(texts, indexes):
+    """The texts at indexes joined by NUL, and where each one starts (plus one past the end)."""
+    starts = []
+    offset = 0
+    for i in indexes:
+        starts.append(offset)
+        offset += len(texts[i]) + 1
+    starts.append(offset)
+    return '\0'.join(texts[i] for i in indexes), starts
+
+
+# Built on first use rather than at import, so starting a worker doesn't pay for tables it may never need
+@cache
+def genre_classifier():
+    return KeywordClassifier(GENRE_MAPPING.items())
+
+
+@cache
+def clean_genre_classifier():
+    return KeywordClassifier(CLEAN_GENRE_RULES)
+
+
+@cache
+def title_hint_classifier():
+    return KeywordClassifier(TITLE_HINTS)
+
+
+def filter_subjects(raw_subjects):
+    filtered_subjects = []
+    for sub in raw_subjects:
+        if isinstance(sub, str):
+            cleaned = sub.strip().lower()
+            if cleaned not in IGNORE_LIST:
+                filtered_subjects.append(cleaned)
+    return filtered_subjects
+
+
+def categorize_genre(raw_subjects):
+    """Convert raw subjects/categories to general genres with filtering of meaningless categories."""
+    if not raw_subjects:
+        return 'Fiction'
+
+    filtered_subjects = filter_subjects(raw_subjects)
+
+    # One line per subject, so a keyword can never match across two subjects
+    subjects_text = '\n'.join(filtered_subjects)
+    return _pick_genre(filtered_subjects, subjects_text, genre_classifier().best_match(subjects_text))
+
+
+def categorize_genres(subject_lists):
+    """categorize_genre for many books at once, with one pass of the keyword table over all their subjects."""
+    filtered = [filter_subjects(raw_subjects) if raw_subjects else [] for raw_subjects in subject_lists]
+    texts = ['\n'.join(filtered_subjects) for filtered_subjects in filtered]
+    matches = genre_classifier().best_matches(texts)
+    return [
+        _pick_genre(filtered_subjects, text, match) if raw_subjects else 'Fiction'
+        for raw_subjects, filtered_subjects, text, match in zip(subject_lists, filtered, texts, matches)
+    ]
+
+
+def _pick_genre(filtered_subjects, subjects_text, match):
+    if match:
+        genre, keyword, position = match
+        if logger.isEnabledFor(logging.DEBUG):
+            start = subjects_text.rfind('\n', 0, position) + 1
+            end = subjects_text.find('\n', position)
+            subject = subjects_text[start:end if end != -1 else None]
+            logger.debug('genre matched', extra={'genre': genre, 'keyword': keyword, 'subject': subject})
+        return genre
+
+    # Fallback: clean up first meaningful subject
+    for subject in filtered_subjects:
+        if subject:
+            cleaned = subject.replace('_', ' ').title()
+            if len(cleaned) < 30:  # Avoid overly long genre names
+                logger.debug('genre fallback', extra={'genre': cleaned})
+                return cleaned
+
+    return 'Fiction'
+
+
+@lru_cache(maxsize=1024)
+def _clean_genre(categories, title):
+    cat_string = " / ".join(categories).lower()
+
+    # Prioriteit: zoek in de categorieën
+    return _pick_clean_genre(categories, title, cat_string, clean_genre_classifier().best_match(cat_string))
+
+
+def _pick_clean_genre(categories, title, cat_string, match):
+    if match:
+        return match[0]
+
+    # Als alleen "fiction" terugkomt → probeer titel te gebruiken als hint
+    if "fiction" in cat_string:
+        hint = title_hint_classifier().best_match(title.lower())
+        if hint:
+            return hint[0]
+
+    # Fallback: pak het laatste stukje van de eerste categorie
+    return categories[0].split(" / ")[-1].capitalize()
+
+
+def clean_genre(categories, title=""):
+    if not categories:
+        return None
+    return _clean_genre(tuple(categories), title)
+
+
+def clean_genres(category_lists, titles=None):
+    """clean_genre for many books at once, with one pass of the keyword table over all their categories."""
+    titles = titles or [""] * len(category_lists)
+    cat_strings = [" / ".join(categories).lower() if categories else "" for categories in category_lists]
+    matches = clean_genre_classifier().best_matches(cat_strings)
+    return [
+        _pick_clean_genre(categories, title, cat_string, match) if categories else None
+        for categories, title, cat_string, match in zip(category_lists, titles, cat_strings, matches)
+    ]
@@ -0,0 +1,17 @@
+"""Gunicorn settings, picked up from the working directory by `gunicorn 'main:create_app()'`.
+
+The app is imported and built once in the master and the workers are forked
+from it, so they start without importing Flask, SQLAlchemy and the rest again
+and share those modules' memory copy-on-write. That is safe because
+create_app opens no database connection, thread or HTTP session: each worker
+opens its own on first use.
+"""
+import gc
+
+preload_app = True
+
+
+def when_ready(server):
+    # Everything the master has loaded so far moves to a generation the collector never scans,
+    # so collections in the workers don't touch (and so copy) the shared pages
+    gc.freeze()
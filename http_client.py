@@ -0,0 +1,348 @@
+"""Shared HTTP layer for the OpenLibrary and Google Books APIs.
+
+All outbound calls go through one pooled requests.Session, and successful JSON
+responses are kept in a small SQLite cache on disk so a work or edition that
+shows up again does not need another trip across the internet.
+
+Every call has a per-host connect/read timeout, is retried a bounded number of
+times with jittered backoff on connection errors, 429s and 5xxs, and goes
+through a per-host circuit breaker: after a run of failures the host is not
+called at all for a while and fetch raises CircuitOpenError straight away, so
+callers fall back to whatever data they already have. skipped_hosts() tells a
+caller which hosts were skipped that way during its own lookups.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from sqlite_cache import SQLiteCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.environ.get('API_CACHE_PATH', 'api_cache.db')
+CACHE_MAX_BYTES = int(os.environ.get('API_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+# Time to live in seconds per endpoint, the first matching prefix wins
+CACHE_TTLS = [
+    ('https://openlibrary.org/search.json', 60 * 60),
+    ('https://openlibrary.org/works/', 7 * 24 * 60 * 60),
+    ('https://openlibrary.org/books/', 30 * 24 * 60 * 60),
+    ('https://www.googleapis.com/books/', 7 * 24 * 60 * 60),
+]
+DEFAULT_TTL = 24 * 60 * 60
+
+# Query parameters that should never end up in a cache key
+SECRET_PARAMS = {'key'}
+
+# Requests per second we allow ourselves per API host, shared by every thread in the process
+RATE_LIMITS = {
+    'openlibrary.org': float(os.environ.get('OPENLIBRARY_RATE_LIMIT', 5)),
+    'www.googleapis.com': float(os.environ.get('GOOGLE_BOOKS_RATE_LIMIT', 10)),
+}
+
+# (connect, read) timeouts in seconds per host
+TIMEOUTS = {
+    'openlibrary.org': (3.05, 10),
+    'covers.openlibrary.org': (3.05, 10),
+    'www.googleapis.com': (3.05, 5),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5  # seconds, the upper bound of the random wait doubles on every retry
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Consecutive failures before a host's circuit opens, and how long it stays open
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 30
+
+# The set of hosts the current skipped_hosts() block found open, if there is one
+_skipped_hosts = contextvars.ContextVar('skipped_hosts', default=None)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """The process's pooled session, created on first use.
+
+    Never shared across a fork: a worker forked from a preloaded gunicorn
+    master gets its own session instead of the master's sockets.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            _session, _session_pid = session, os.getpid()
+        return _session
+
+
+# Response headers kept with a cached body: the validators a later revalidate() sends back
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+
+class CachedResponse:
+    """The parts of requests.Response the helpers in main.py use."""
+
+    def __init__(self, status_code, content, from_cache=False, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache(SQLiteCache):
+    """Disk-backed response cache with per-entry expiry, LRU eviction and a byte cap."""
+
+    table = 'responses'
+    columns = (('status', 'INTEGER'), ('expires_at', 'REAL'), ('etag', 'TEXT'), ('last_modified', 'TEXT'))
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        super().__init__(path, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def setup(self, conn):
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(responses)')}
+        if columns and 'etag' not in columns:
+            conn.execute('DROP TABLE responses')  # written by an older version, it's only a cache
+
+    def stale(self):
+        return 'expires_at <= ?', (time.time(),)
+
+    def get(self, cache_key):
+        row = self.lookup(cache_key, ['status', 'body', 'etag', 'last_modified'], 'expires_at > ?', (time.time(),))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+        headers = {name: value for name, value in zip(CACHED_HEADERS, row[2:]) if value}
+        return CachedResponse(row[0], row[1], from_cache=True, headers=headers)
+
+    def set(self, cache_key, status, body, ttl, headers=None):
+        headers = headers or {}
+        self.store(cache_key, body, status=status, expires_at=time.time() + ttl,
+                   etag=headers.get('ETag') or '', last_modified=headers.get('Last-Modified') or '')
+
+    def stats(self):
+        entries, size = self.size()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+
+class RateLimiter:
+    """Token bucket that makes callers wait once they go over `rate` requests per second."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops calling a host after `threshold` failures in a row, then lets one trial call through after `reset`."""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset = reset
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset or self._trial_running:
+                return False
+            # Half open: this caller gets to find out whether the host is back
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def end_trial(self):
+        """Let the next caller try again if a trial call ended without recording its outcome."""
+        with self._lock:
+            self._trial_running = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+cache = ResponseCache()
+rate_limiters = {host: RateLimiter(rate) for host, rate in RATE_LIMITS.items() if rate > 0}
+breakers = {}
+_breakers_lock = threading.Lock()
+
+
+metrics.add_collector('app_api_cache_hits_total', 'API responses answered from the disk cache.', 'counter',
+                      lambda: cache.hits)
+metrics.add_collector('app_api_cache_misses_total', 'API lookups the disk cache could not answer.', 'counter',
+                      lambda: cache.misses)
+
+
+def breaker_for(host):
+    with _breakers_lock:
+        if host not in breakers:
+            breakers[host] = CircuitBreaker()
+        return breakers[host]
+
+
+@contextmanager
+def skipped_hosts():
+    """Collect the hosts fetch() skipped because of an open circuit during the block, as a set.
+
+    Only this block's calls count, not other threads' (use submit_in_context to hand lookups to a pool),
+    so a breaker another job opened, or one for an unrelated host, doesn't make this lookup partial.
+    Blocks nest: on exit, the hosts are added to the enclosing block's set as well.
+    """
+    hosts = set()
+    token = _skipped_hosts.set(hosts)
+    try:
+        yield hosts
+    finally:
+        _skipped_hosts.reset(token)
+        outer = _skipped_hosts.get()
+        if outer is not None:
+            outer.update(hosts)
+
+
+def submit_in_context(pool, fn, *args):
+    """pool.submit, running fn in a copy of the caller's context so its skipped hosts count for the caller."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def ttl_for(url):
+    for prefix, ttl in CACHE_TTLS:
+        if url.startswith(prefix):
+            return ttl
+    return DEFAULT_TTL
+
+
+def cache_key_for(url, params=None):
+    if not params:
+        return url
+    public_params = sorted((k, v) for k, v in params.items() if k not in SECRET_PARAMS)
+    return f"{url}?{urlencode(public_params)}"
+
+
+def fetch(url, **kwargs):
+    """session.get with the host's timeout, rate limit, retries and circuit breaker; timed for /metrics."""
+    host = urlsplit(url).hostname
+    breaker = breaker_for(host)
+    if not breaker.allow():
+        metrics.record_http(host, 'circuit_open', 0)
+        skipped = _skipped_hosts.get()
+        if skipped is not None:
+            skipped.add(host)
+        raise CircuitOpenError(f"Circuit open for {host}")
+    kwargs.setdefault('timeout', TIMEOUTS.get(host, DEFAULT_TIMEOUT))
+    try:
+        return _fetch_with_retries(url, host, breaker, kwargs)
+    finally:
+        # Whatever ended the call, a half-open breaker must not keep waiting for this trial's outcome
+        breaker.end_trial()
+
+
+def _fetch_with_retries(url, host, breaker, kwargs):
+    limiter = rate_limiters.get(host)
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** (attempt - 1)))
+        if limiter:
+            limiter.acquire()
+        started_at = time.perf_counter()
+        try:
+            response = get_session().get(url, **kwargs)
+        except requests.RequestException as e:
+            metrics.record_http(host, 'error', time.perf_counter() - started_at)
+            if attempt == MAX_RETRIES or not isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                breaker.record_failure()
+                raise
+            logger.info('Retrying %s after %s', url, type(e).__name__)
+            continue
+        metrics.record_http(host, response.status_code, time.perf_counter() - started_at)
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            logger.info('Retrying %s after HTTP %s', url, response.status_code)
+            continue
+        # Still throttled or failing after the retries: either way the host needs a break
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+
+def get(url, params=None):
+    """GET a JSON endpoint, answering from the disk cache when we can."""
+    cache_key = cache_key_for(url, params)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = fetch(url, params=params)
+    headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+    if response.status_code == 200:
+        cache.set(cache_key, response.status_code, response.content, ttl_for(url), headers)
+    return CachedResponse(response.status_code, response.content, headers=headers)
+
+
+def revalidate(url, etag=None, last_modified=None):
+    """Conditional GET past the disk cache. A 304 means the copy we stored (with these validators) is current."""
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    response = fetch(url, headers=headers)
+    if response.status_code == 200:
+        cache.set(cache_key_for(url), response.status_code, response.content, ttl_for(url), response.headers)
+    return response
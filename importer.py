@@ -0,0 +1,124 @@
+"""Reading bulk import files: Goodreads-style CSV exports or plain lists of OpenLibrary IDs."""
+import csv
+import io
+import json
+import os
+import re
+from datetime import datetime
+
+OLID_PATTERN = re.compile(r'OL\d+[WM]', re.IGNORECASE)
+
+# Goodreads "Exclusive Shelf" values we understand
+SHELF_READ = 'read'
+SHELF_CURRENT = 'currently-reading'
+SHELF_TBR = 'to-read'
+
+
+def read_rows(stream):
+    """Yield one dict per book from a text stream, detecting CSV vs. an OLID list from the first line."""
+    first_line = stream.readline()
+    if not first_line:
+        return
+    if ',' in first_line and 'title' in first_line.lower():
+        reader = csv.DictReader(_prepend(first_line, stream))
+        for row in reader:
+            parsed = parse_goodreads_row(row)
+            if parsed:
+                yield parsed
+    else:
+        for line in _prepend(first_line, stream):
+            olid = parse_olid(line)
+            if olid:
+                yield {'olid': olid}
+
+
+def _prepend(first_line, stream):
+    yield first_line
+    yield from stream
+
+
+def parse_olid(line):
+    """Pull an OpenLibrary work/edition ID out of a line like 'OL45804W' or '/works/OL45804W'."""
+    match = OLID_PATTERN.search(line)
+    return match.group(0).upper() if match else None
+
+
+def parse_goodreads_row(row):
+    title = (row.get('Title') or row.get('title') or '').strip()
+    if not title:
+        return None
+    # Goodreads writes ISBNs as ="9780..." to keep spreadsheets from mangling them
+    isbn = re.sub(r'[^0-9Xx]', '', row.get('ISBN13') or row.get('ISBN') or '')
+    rating = _to_float(row.get('My Rating'))
+    return {
+        'title': title,
+        'author': (row.get('Author') or row.get('author') or '').strip() or None,
+        'isbn': isbn or None,
+        'star_rating': rating if rating else None,
+        'date_finished': _to_date(row.get('Date Read')),
+        'shelf': (row.get('Exclusive Shelf') or '').strip().lower() or None,
+    }
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_date(value):
+    if not value:
+        return None
+    for fmt in ('%Y/%m/%d', '%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def search_query(row):
+    """The OpenLibrary search query that should find this row's book."""
+    if row.get('olid'):
+        return row['olid']
+    if row.get('isbn'):
+        return f"isbn:{row['isbn']}"
+    if row.get('author'):
+        return f"{row['title']} {row['author']}"
+    return row['title']
+
+
+def open_text(path_or_file):
+    if isinstance(path_or_file, (str, os.PathLike)):
+        return open(path_or_file, newline='', encoding='utf-8-sig')
+    return io.TextIOWrapper(path_or_file, newline='', encoding='utf-8-sig')
+
+
+class Checkpoint:
+    """Remembers how many rows of an import file are done, so an interrupted run can pick up again."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = 0
+        self.imported = 0
+        self.skipped = 0
+        self.finished = False
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.done = state.get('done', 0)
+            self.imported = state.get('imported', 0)
+            self.skipped = state.get('skipped', 0)
+            self.finished = state.get('finished', False)
+
+    def save(self):
+        state = {'done': self.done, 'imported': self.imported, 'skipped': self.skipped, 'finished': self.finished}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.done = self.imported = self.skipped = 0
+        self.finished = False
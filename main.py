@@ -1,40 +1,104 @@
-from flask import Flask, render_template, redirect, url_for, request
+from flask import Flask, Blueprint, render_template, redirect, url_for, request, jsonify, send_file, abort, \
+    Response, stream_with_context, current_app
 from flask.cli import load_dotenv
 from flask_bootstrap import Bootstrap5
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
-from sqlalchemy import Integer, String, Float, desc, Date, Text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker, Session, undefer_group
+from sqlalchemy import Integer, String, Float, desc, Date, Text, DateTime, ForeignKey, update, event, inspect, case, \
+    extract, func, Index, literal_column, text, bindparam, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
 from flask_wtf import FlaskForm, CSRFProtect
+from flask_wtf.file import FileField, FileRequired
 from wtforms import StringField, SubmitField, FloatField, DateField
 from wtforms.validators import DataRequired, Optional
 from dotenv import load_dotenv
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from collections import Counter
-import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests import RequestException
+from genres import categorize_genre, categorize_genres, clean_genre, clean_genres
+import http_client
+import importer
+import exporter
+import assets
+import compression
+import covers
+import openlibrary_search
+import ol_index
+import metrics
+import page_cache
+import threading
+import hashlib
+import logging
+import click
+import json
+import time
+import re
 import os
 
 load_dotenv()
 
-GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
+logger = logging.getLogger(__name__)
 
+GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
-Bootstrap5(app)
-CSRFProtect(app)
+# Shared pool for the OpenLibrary / Google Books lookups done while adding a book
+MAX_EDITION_LOOKUPS = 3
+# Hedged edition lookups: ask one edition, and only ask the next when it hasn't answered within HEDGE_DELAY
+HEDGE_EDITION_LOOKUPS = os.environ.get('HEDGE_EDITION_LOOKUPS', '').lower() in ('1', 'true', 'yes')
+HEDGE_DELAY = 0.5
+enrichment_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('ENRICHMENT_WORKERS', 8)))
+
+# Background jobs that fill in genre/description/pages after /find has already returned
+MAX_JOB_ATTEMPTS = 3
+JOB_RETRY_DELAY = 5  # seconds, doubled on every retry
+JOB_LEASE = 10 * 60  # a job still 'running' after this long is assumed to belong to a dead worker
+job_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('JOB_WORKERS', 2)))
+jobs_resumed = False
+jobs_resumed_lock = threading.Lock()
+
+# Stored OpenLibrary metadata older than this is rechecked in the background when its detail page is viewed
+METADATA_MAX_AGE = timedelta(days=30)
+revalidating = set()
+revalidating_lock = threading.Lock()
+
+TOP_BOOKS_PAGE_SIZE = 24
+SEARCH_LIMIT = 20
+COVER_MAX_AGE = 365 * 24 * 60 * 60
+SUGGEST_MIN_CHARS = 3
+SUGGEST_LIMIT = 8
+
+# Bulk imports (CSV / OLID lists)
+IMPORT_DIR = os.environ.get('IMPORT_DIR', 'imports')
+IMPORT_BATCH_SIZE = 100
+IMPORT_WORKERS = 4
+# Per process: the same file uploaded to two gunicorn workers at once is imported by both. Book.title being
+# unique keeps duplicates out, but the import that loses a race stops there until the file is uploaded again.
+running_imports = set()
+running_imports_lock = threading.Lock()
+
+# Export
+EXPORT_CHUNK_SIZE = 1000
+
+# Backfilling metadata of books already in the library (flask backfill)
+BACKFILL_CHUNK_SIZE = 100
+BACKFILL_WORKERS = 4
+BACKFILL_FIELDS = ('pages', 'genre', 'description', 'edition_key', 'work_key')
+
+
+# Everything below registers on this blueprint; create_app (at the bottom) builds the Flask app around it
+bp = Blueprint('books', __name__, cli_group=None)
+csrf = CSRFProtect()
 
 # CREATE DB
 class Base(DeclarativeBase):
     pass
 
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DB_URI', "sqlite:///books.db")
-
 # Create the extension
 db = SQLAlchemy(model_class=Base)
 
-# Initialise the app with the extension
-db.init_app(app)
-
 
 # CREATE TABLE
 class Book(db.Model):
@@ -42,19 +106,201 @@ class Book(db.Model):
     title: Mapped[str] = mapped_column(String(250), unique=True, nullable=False)
     author: Mapped[str] = mapped_column(String(250), nullable = False)
     year: Mapped[int] = mapped_column(Integer, nullable=False)
-    star_rating: Mapped[float] = mapped_column(Float, nullable=True)
-    spice_rating: Mapped[float] = mapped_column(Float, nullable=True)
+    star_rating: Mapped[float] = mapped_column(Float, nullable=True, active_history=True)
+    spice_rating: Mapped[float] = mapped_column(Float, nullable=True, active_history=True)
     ranking: Mapped[int] = mapped_column(Integer, nullable=True)
-    review: Mapped[str] = mapped_column(String(250), nullable=True)
+    review: Mapped[str] = mapped_column(String(250), nullable=True, deferred=True, deferred_group='details')
     img_url: Mapped[str] = mapped_column(String(500), nullable=True)
     date_started: Mapped[datetime] = mapped_column(Date, nullable = True)
-    date_finished: Mapped[datetime] = mapped_column(Date, nullable = True)
-    pages: Mapped[int] = mapped_column(Integer, nullable=True)
-    genre: Mapped[str] = mapped_column(String(100), nullable=True)
-    description: Mapped[str] = mapped_column(Text, nullable= True)
-
-with app.app_context():
+    date_finished: Mapped[datetime] = mapped_column(Date, nullable = True, active_history=True)
+    pages: Mapped[int] = mapped_column(Integer, nullable=True, active_history=True)
+    genre: Mapped[str] = mapped_column(String(100), nullable=True, active_history=True)
+    # Deferred: only the detail and edit pages show these, everything else leaves them in the database
+    description: Mapped[str] = mapped_column(Text, nullable= True, deferred=True, deferred_group='details')
+    # Where the metadata came from, and when we last fetched / confirmed it (see revalidate_book)
+    work_key: Mapped[str] = mapped_column(String(50), nullable=True)
+    edition_key: Mapped[str] = mapped_column(String(50), nullable=True)
+    cover_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    enriched_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    revalidated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    work_etag: Mapped[str] = mapped_column(String(200), nullable=True)
+    work_last_modified: Mapped[str] = mapped_column(String(100), nullable=True)
+    # Case, punctuation and diacritics folded "title|author", kept up to date by set_match_key
+    match_key: Mapped[str] = mapped_column(String(500), nullable=True)
+
+
+# Indexes for the hot filters: currently reading / TBR (unfinished books, split on date_started),
+# finished this year and recently finished (date_finished), and the top books ranking
+UNRATED = literal_column('-1')  # literal, so queries match the expression index below
+Index('ix_book_date_finished', Book.date_finished)
+Index('ix_book_unfinished_started', Book.date_started,
+      sqlite_where=Book.date_finished.is_(None), postgresql_where=Book.date_finished.is_(None))
+Index('ix_book_top_rated', desc(func.coalesce(Book.star_rating, UNRATED)), Book.id,
+      sqlite_where=Book.date_finished.isnot(None), postgresql_where=Book.date_finished.isnot(None))
+# Duplicate checks before adding a book: same OpenLibrary work, or same normalized title and author
+Index('ix_book_work_key', Book.work_key)
+Index('ix_book_match_key', Book.match_key)
+# Books a failed lookup left without pages, genre or description, for `flask backfill`
+MISSING_METADATA = or_(Book.pages.is_(None), Book.genre.is_(None), Book.description.is_(None))
+Index('ix_book_missing_metadata', Book.id, Book.enriched_at,
+      sqlite_where=MISSING_METADATA, postgresql_where=MISSING_METADATA)
+
+
+def library_key(title, author):
+    return f"{ol_index.normalize(title)}|{ol_index.normalize(author)}"
+
+
+@event.listens_for(Book, 'before_insert')
+@event.listens_for(Book, 'before_update')
+def set_match_key(mapper, connection, book):
+    book.match_key = library_key(book.title, book.author)
+
+
+class EnrichmentJob(db.Model):
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    book_id: Mapped[int] = mapped_column(Integer, ForeignKey('book.id', ondelete='CASCADE'), nullable=False, index=True)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)  # the OpenLibrary search doc as JSON
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='pending', index=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[str] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    # When a retried job is due, so a restarted process keeps the backoff instead of running it straight away
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class StatsRollup(db.Model):
+    """Running totals behind /stats, one row per chart slice. Kept in step with Book by the flush hooks below."""
+    dimension: Mapped[str] = mapped_column(String(20), primary_key=True)  # total, genre, pages, star, spice, month
+    bucket: Mapped[str] = mapped_column(String(100), primary_key=True)
+    books: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    pages: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rating_sum: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    rating_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class SchemaMigration(db.Model):
+    id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Cached pages (home, tbr, top books) stay valid until the next commit that writes a Book
+page_cache.track_writes(Session, Book)
+
+
+# ---------------------------------------------- SCHEMA MIGRATIONS ------------------------------------------------
+# db.create_all() only creates missing tables, so changes to existing tables go here.
+# Append new steps at the end and never edit one that has shipped.
+def create_indexes(connection, *names):
+    for index in Book.__table__.indexes:
+        if index.name in names:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def create_book_indexes(connection):
+    create_indexes(connection, 'ix_book_date_finished', 'ix_book_unfinished_started', 'ix_book_top_rated')
+
+
+# Full-text search over the library: an FTS5 table kept in sync by triggers on SQLite,
+# a generated tsvector column with a GIN index on Postgres
+SEARCH_COLUMNS = ('title', 'author', 'genre', 'description', 'review')
+
+
+def create_book_search(connection):
+    if connection.dialect.name == 'sqlite':
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join(f"new.{c}" for c in SEARCH_COLUMNS)
+        old_values = ', '.join(f"old.{c}" for c in SEARCH_COLUMNS)
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5({columns}, "
+            f"content='book', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book BEGIN "
+            f"INSERT INTO book_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book BEGIN "
+            f"INSERT INTO book_fts(book_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE OF {columns} ON book BEGIN "
+            f"INSERT INTO book_fts(book_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO book_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        connection.exec_driver_sql("INSERT INTO book_fts(book_fts) VALUES ('rebuild')")
+    elif connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql(
+            "ALTER TABLE book ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(author, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(genre, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'C') || "
+            "setweight(to_tsvector('english', coalesce(review, '')), 'C')) STORED"
+        )
+        connection.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_book_search_vector ON book USING GIN (search_vector)"
+        )
+
+
+def add_book_openlibrary_columns(connection):
+    existing = {column['name'] for column in inspect(connection).get_columns('book')}
+    for name in OPENLIBRARY_COLUMNS:
+        if name not in existing:
+            column_type = Book.__table__.c[name].type.compile(connection.dialect)
+            connection.exec_driver_sql(f"ALTER TABLE book ADD COLUMN {name} {column_type}")
+
+
+def add_book_match_key(connection):
+    if 'match_key' not in {column['name'] for column in inspect(connection).get_columns('book')}:
+        column_type = Book.__table__.c.match_key.type.compile(connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE book ADD COLUMN match_key {column_type}")
+    books = connection.execute(db.select(Book.id, Book.title, Book.author).where(Book.match_key.is_(None))).all()
+    set_key = Book.__table__.update().where(Book.__table__.c.id == bindparam('book_id'))
+    for start in range(0, len(books), 1000):
+        connection.execute(set_key, [{'book_id': book.id, 'match_key': library_key(book.title, book.author)}
+                                     for book in books[start:start + 1000]])
+    create_indexes(connection, 'ix_book_work_key', 'ix_book_match_key')
+
+
+def create_missing_metadata_index(connection):
+    create_indexes(connection, 'ix_book_missing_metadata')
+
+
+def add_job_next_attempt_at(connection):
+    if 'next_attempt_at' not in {column['name'] for column in inspect(connection).get_columns('enrichment_job')}:
+        column_type = EnrichmentJob.__table__.c.next_attempt_at.type.compile(connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE enrichment_job ADD COLUMN next_attempt_at {column_type}")
+
+
+OPENLIBRARY_COLUMNS = ('work_key', 'edition_key', 'cover_id', 'enriched_at', 'revalidated_at', 'work_etag',
+                       'work_last_modified')
+
+MIGRATIONS = [
+    ('0001_book_indexes', create_book_indexes),
+    ('0002_book_search', create_book_search),
+    ('0003_book_openlibrary_ids', add_book_openlibrary_columns),
+    ('0004_book_match_key', add_book_match_key),
+    ('0005_book_missing_metadata_index', create_missing_metadata_index),
+    ('0006_enrichment_job_next_attempt_at', add_job_next_attempt_at),
+]
+
+
+def upgrade_schema():
+    """Create missing tables, then run every migration this database has not seen yet."""
     db.create_all()
+    applied = set(db.session.execute(db.select(SchemaMigration.id)).scalars())
+    for migration_id, migrate in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        try:
+            migrate(db.session.connection())
+            db.session.add(SchemaMigration(id=migration_id))
+            db.session.commit()
+            print(f"Applied migration {migration_id}")
+        except IntegrityError:
+            # Another worker applied it at the same time
+            db.session.rollback()
 
 
 # --------------------------------------------- FORMS -------------------------------------------------------
@@ -72,21 +318,27 @@ class AddBookForm(FlaskForm):
     add = SubmitField('Add Book')
 
 
+class ImportBooksForm(FlaskForm):
+    file = FileField('Goodreads CSV export or a list of OpenLibrary IDs', validators=[FileRequired()])
+    upload = SubmitField('Import Books')
+
+
 # ------------------------------------------------- HELPERS -------------------------------------------------
 def search_openlibrary(query, limit=10):
     """Search books via OpenLibrary and return docs."""
-    response = requests.get(f"https://openlibrary.org/search.json?q={query}")
-    results = response.json().get("docs", [])
-    return results[:limit]
+    return openlibrary_search.search(query, limit=limit)
 
 
 def get_book_details(work_key):
-    """Get additional book details from OpenLibrary work API."""
+    """Get additional book details, from the local dump index if it has the work, else the OpenLibrary work API."""
+    local = ol_index.lookup_work(work_key)
+    if local:
+        return {'subjects': local['subjects'], 'description': local['description']}
     try:
         if work_key.startswith('/works/'):
             work_key = work_key[7:]
 
-        response = requests.get(f"https://openlibrary.org/works/{work_key}.json")
+        response = http_client.get(f"https://openlibrary.org/works/{work_key}.json")
         if response.status_code == 200:
             work_data = response.json()
 
@@ -101,248 +353,247 @@ def get_book_details(work_key):
             elif isinstance(desc_data, str):
                 description = desc_data
 
+            # Kept with the book, so revalidate_book can ask whether this work changed since
             return {
                 'subjects': raw_subjects,
-                'description': description
+                'description': description,
+                'work_etag': response.headers.get('ETag'),
+                'work_last_modified': response.headers.get('Last-Modified'),
             }
-    except Exception as e:
+    except (RequestException, ValueError) as e:
         print(f"Error fetching work details for {work_key}: {e}")
 
     return {'subjects': [], 'description': None}
 
 
-def get_book_pages_from_editions(edition_keys, median_pages=None):
-    """Try multiple editions to find page count."""
-    if edition_keys:
-        # Try first few editions (avoid overloading the API)
-        for edition_key in edition_keys[:3]:
-            try:
-                if edition_key.startswith('/books/'):
-                    edition_key = edition_key[7:]
+def submit_lookup(fn, *args):
+    """Run a lookup on the enrichment pool; hosts it skips count towards the caller's http_client.skipped_hosts."""
+    return http_client.submit_in_context(enrichment_pool, fn, *args)
 
-                response = requests.get(f"https://openlibrary.org/books/{edition_key}.json")
-                if response.status_code == 200:
-                    edition_data = response.json()
-                    pages = edition_data.get('number_of_pages')
 
-                    # Ensure it's a positive integer
-                    if pages and isinstance(pages, (int, float)) and pages > 0:
-                        return int(pages)
-            except Exception:
-                continue  # ignore errors and try next edition
+def start_edition_lookups(edition_keys):
+    """Start the edition lookups for a book. Returns (futures, keys held back for hedging)."""
+    edition_keys = list(edition_keys[:MAX_EDITION_LOOKUPS])
+    started = 1 if HEDGE_EDITION_LOOKUPS else len(edition_keys)
+    futures = [submit_lookup(get_edition_pages, key) for key in edition_keys[:started]]
+    return futures, edition_keys[started:]
 
-    # Fallback: use median pages from search result
-    if median_pages and isinstance(median_pages, (int, float)) and median_pages > 0:
-        return int(median_pages)
 
-    return None
+def first_edition_pages(futures, hedge_keys=()):
+    """Return (edition key, pages) of the first edition lookup with a valid page count, or (None, None).
+
+    Lookups still waiting are cancelled. Each of the hedge_keys is only looked
+    up once the lookups in flight have failed or not answered within HEDGE_DELAY.
+    """
+    futures = list(futures)
+    hedge_keys = list(hedge_keys)
+    pending = set(futures)
+    try:
+        while pending or hedge_keys:
+            if not pending:
+                future = submit_lookup(get_edition_pages, hedge_keys.pop(0))
+                futures.append(future)
+                pending.add(future)
+            done, pending = wait(pending, timeout=HEDGE_DELAY if hedge_keys else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    edition_key, pages = future.result()
+                except Exception:
+                    continue  # ignore errors and wait for the next edition
+                if pages:
+                    return edition_key, pages
+            if not done and hedge_keys:
+                # Slow answer, ask the next edition as well
+                future = submit_lookup(get_edition_pages, hedge_keys.pop(0))
+                futures.append(future)
+                pending.add(future)
+    finally:
+        for future in futures:
+            future.cancel()
+    return None, None
+
+
+def get_edition_pages(edition_key):
+    """Get (edition_key, a positive page count or None) for a specific edition."""
+    pages = get_edition_details(edition_key)
+    # Ensure it's a positive integer
+    if pages and isinstance(pages, (int, float)) and pages > 0:
+        return edition_key, int(pages)
+    return edition_key, None
 
 
 def get_edition_details(edition_key):
     """Get page count from a specific edition."""
+    pages = ol_index.lookup_edition_pages(edition_key)
+    if pages:
+        return pages
     try:
         if edition_key.startswith('/books/'):
             edition_key = edition_key[7:]  # Remove '/books/' prefix
 
-        response = requests.get(f"https://openlibrary.org/books/{edition_key}.json")
+        response = http_client.get(f"https://openlibrary.org/books/{edition_key}.json")
         if response.status_code == 200:
             edition_data = response.json()
             return edition_data.get('number_of_pages')
-    except:
-        pass
+    except (RequestException, ValueError) as e:
+        print(f"Error fetching edition {edition_key}: {e}")
     return None
 
 
-def book_from_result(result, started=False):
-    """Create a Book object with improved debugging."""
+def stub_book_from_result(result, started=False):
+    """Create a Book object from the search doc alone, without any extra lookups."""
     title = result.get('title', 'No Title')
     author_name = result.get('author_name', ['Unknown'])[0]
     year = result.get('first_publish_year', 0)
     cover_id = result.get('cover_i')
     img_url = f"https://covers.openlibrary.org/b/id/{cover_id}-L.jpg" if cover_id else None
 
-
-    # Initialize variables
-    genre = None
-    description = None
-    pages = None
-
-    # --- 1. Try OpenLibrary for genre ---
-    if result.get('key'):
-        work_details = get_book_details(result['key'])
-        subjects = work_details.get('subjects', [])
-        if subjects:
-            genre = categorize_genre(subjects)
-        description = work_details.get('description')
-
-    # --- 2. Try OpenLibrary for pages ---
-    # Try from search result first
-    pages = result.get('number_of_pages_median')
-    if pages:
-        print(f"Got pages from search median: {pages}")
-
-    # Try from editions if no pages yet
-    if not pages:
-        edition_keys = result.get('edition_key', [])
-        if edition_keys:
-            pages = get_book_pages_from_editions(edition_keys)
-
-    # --- 3. Fallback to Google Books ---
-    google_data = get_google_books_data(title, author_name)
-
-    # Only use Google Books genre if OpenLibrary failed or returned generic "Fiction"
-    if not genre or genre.lower() in ['fiction', 'unknown']:
-        google_categories = google_data.get('categories', [])
-        if google_categories:
-            google_genre = categorize_genre(google_categories)
-            if google_genre:
-                genre = google_genre
-
-    # Use Google Books for missing description/pages
-    if not description:
-        description = google_data.get('description')
-    if not pages:
-        pages = google_data.get('pages')
-
-
     return Book(
         title=title,
         author=author_name,
         year=year,
         img_url=img_url,
-        pages=pages,
-        genre=genre,
-        description=description,
-        date_started=date.today() if started else None
+        date_started=date.today() if started else None,
+        work_key=ol_index.short_key(result.get('key')),
+        cover_id=cover_id
     )
 
 
-def clean_genre(categories, title=""):
-    if not categories:
-        return None
-
-    cat_string = " / ".join(categories).lower()
-
-    # Prioriteit: zoek in de categorieën
-    if "fantasy" in cat_string:
-        return "Fantasy"
-    if "romance" in cat_string:
-        return "Romance"
-    if "thriller" in cat_string:
-        return "Thriller"
-    if "science fiction" in cat_string or "sci-fi" in cat_string:
-        return "Science Fiction"
-    if "horror" in cat_string:
-        return "Horror"
-    if "young adult" in cat_string or "ya" in cat_string:
-        return "Young Adult"
-
-    # Als alleen "fiction" terugkomt → probeer titel te gebruiken als hint
-    if "fiction" in cat_string:
-        if any(word in title.lower() for word in ["dragon", "sword", "magic", "kingdom", "throne"]):
-            return "Fantasy"
-        if any(word in title.lower() for word in ["love", "kiss", "heart", "desire"]):
-            return "Romance"
-
-    # Fallback: pak het laatste stukje van de eerste categorie
-    return categories[0].split(" / ")[-1].capitalize()
-
-
-def categorize_genre(raw_subjects):
-    """Convert raw subjects/categories to general genres with filtering of meaningless categories."""
-    if not raw_subjects:
-        return 'Fiction'
-
-    filtered_subjects = []
-    ignore_list = ['fiction', 'books', 'literature', 'english', 'new york times bestseller', 'Serie:gods of the game']
-
-    for sub in raw_subjects:
-        if isinstance(sub, str):
-            cleaned = sub.strip().lower()
-            if cleaned not in ignore_list:
-                filtered_subjects.append(cleaned)
-
-    subjects_text = ' '.join(filtered_subjects)
-
-    # Enhanced genre mapping with more keywords
-    genre_mapping = {
-        'Romance': [
-            'romance', 'love story', 'romantic', 'love stories', 'contemporary romance',
-            'historical romance', 'romantic fiction', 'love', 'relationships', 'sports', 'game'
-        ],
-        'Fantasy': [
-            'fantasy', 'fantasy fiction', 'magic', 'magical', 'dragons', 'wizards',
-            'elves', 'sword and sorcery', 'epic fantasy', 'urban fantasy', 'paranormal',
-            'high fantasy', 'dark fantasy', 'magical realism'
-        ],
-        'Science Fiction': [
-            'science fiction', 'sci-fi', 'science fiction & fantasy', 'space', 'aliens',
-            'future', 'dystopian', 'cyberpunk', 'time travel', 'robots', 'space opera',
-            'dystopian fiction', 'alternate history'
-        ],
-        'Mystery': [
-            'mystery', 'mystery & detective', 'detective', 'crime', 'murder',
-            'investigation', 'police', 'noir', 'cozy mystery', 'crime fiction',
-            'detective fiction', 'mystery fiction'
-        ],
-        'Thriller': [
-            'thriller', 'suspense', 'psychological thriller', 'action thriller',
-            'spy thriller', 'domestic thriller', 'legal thriller'
-        ],
-        'Horror': [
-            'horror', 'horror fiction', 'ghost', 'vampire', 'zombie', 'supernatural',
-            'gothic', 'occult', 'paranormal horror'
-        ],
-        'Historical Fiction': [
-            'historical fiction', 'historical', 'world war', 'civil war',
-            'medieval', 'victorian', 'ancient', 'period fiction', 'historical novel'
-        ],
-        'Young Adult': [
-            'young adult', 'ya', 'teen', 'coming of age', 'teenage', 'adolescent',
-            'young adult fiction', 'children\'s books', 'juvenile fiction'
-        ],
-        'Biography': [
-            'biography', 'autobiography', 'memoir', 'life story', 'biographical',
-            'personal narratives'
-        ],
-        'Self-Help': [
-            'self-help', 'personal development', 'motivation', 'psychology',
-            'business', 'productivity', 'success', 'self-improvement'
-        ],
-        'Non-Fiction': [
-            'nonfiction', 'non-fiction', 'history', 'politics', 'science', 'nature',
-            'travel', 'cooking', 'health', 'religion', 'philosophy', 'biography & autobiography'
-        ],
-        'Literary Fiction': [
-            'literary fiction', 'literature', 'classic', 'literary', 'classics',
-            'contemporary literature', 'modern literature'
-        ],
-        'Adventure': [
-            'adventure', 'action', 'survival', 'expedition', 'action & adventure'
-        ],
-        'Children': [
-            'children', 'juvenile', 'picture book', 'kids', 'children\'s literature',
-            'picture books', 'early readers'
-        ]
+def owned_books(results):
+    """Map the OLID of every search doc that is already in the library to that book's id, in one query."""
+    if not results:
+        return {}
+    work_keys = {openlibrary_search.olid_of(result): result for result in results}
+    match_keys = {library_key(result.get('title', 'No Title'), result.get('author_name', ['Unknown'])[0]): olid
+                  for olid, result in work_keys.items()}
+    owned = {}
+    for book in db.session.execute(owned_books_query(list(work_keys), list(match_keys))):
+        if book.work_key in work_keys:
+            owned[book.work_key] = book.id
+        if book.match_key in match_keys:
+            owned.setdefault(match_keys[book.match_key], book.id)
+    return owned
+
+
+def apply_details(book, details, only_missing=False):
+    """Copy the output of enrich_result onto a book, optionally only into fields that are still empty."""
+    for field, value in details.items():
+        if value and not (only_missing and getattr(book, field)):
+            setattr(book, field, value)
+    book.enriched_at = book.revalidated_at = datetime.utcnow()
+
+
+def enrich_result(result):
+    """Look up genre, description, pages and the edition we take them from for a search doc."""
+    return enrich_results([result])[0][0]
+
+
+def enrich_results(results, pool=None):
+    """enrich_result for many search docs. Returns (details, hosts skipped by an open circuit) per doc.
+
+    Each doc's lookups run on `pool` if one is given. Their subjects and categories are classified
+    afterwards, with one categorize_genres pass per source for the whole batch.
+    """
+    map_docs = pool.map if pool else map
+    lookups = list(map_docs(local_lookup, results))
+    for lookup, genre in zip(lookups, categorize_genres([lookup['subjects'] for lookup in lookups])):
+        if lookup['subjects']:
+            lookup['genre'] = genre
+    lookups = list(map_docs(remote_lookup, results, lookups))
+
+    # --- 1. OpenLibrary subjects win over the local index's ---
+    for lookup, genre in zip(lookups, categorize_genres([lookup['work_subjects'] for lookup in lookups])):
+        if lookup['work_subjects']:
+            lookup['genre'] = genre
+
+    # --- 3. Only use Google Books genre if OpenLibrary failed or returned generic "Fiction" ---
+    generic = [lookup for lookup in lookups
+               if (not lookup['genre'] or lookup['genre'].lower() in ['fiction', 'unknown'])
+               and lookup['google'].get('categories')]
+    for lookup, google_genre in zip(generic, categorize_genres([lookup['google']['categories'] for lookup in generic])):
+        if google_genre:
+            lookup['genre'] = google_genre
+
+    enriched = []
+    for lookup in lookups:
+        # Use Google Books for missing description/pages
+        details = {
+            'pages': lookup['pages'] or lookup['google'].get('pages'),
+            'genre': lookup['genre'],
+            'description': lookup['description'] or lookup['google'].get('description'),
+            'edition_key': lookup['edition_key'],
+            **lookup['validators'],
+        }
+        enriched.append((details, lookup['skipped_hosts']))
+    return enriched
+
+
+def local_lookup(result):
+    """What the search doc and the local dump index know, without any network calls."""
+    title = result.get('title', 'No Title')
+    author_name = result.get('author_name', ['Unknown'])[0]
+    local_work = ol_index.lookup_work(result.get('key')) or ol_index.lookup_by_title_author(title, author_name)
+    pages = result.get('number_of_pages_median')
+    if pages:
+        print(f"Got pages from search median: {pages}")
+    else:
+        edition_keys = result.get('edition_key', [])[:MAX_EDITION_LOOKUPS]
+        pages = ol_index.lookup_pages(edition_keys, local_work['key'] if local_work else result.get('key'))
+    return {
+        'local_work': local_work,
+        'subjects': local_work['subjects'] if local_work else [],
+        'genre': None,
+        'description': local_work['description'] if local_work else None,
+        'pages': pages,
+        'edition_key': next(iter(result.get('edition_key', [])), None),
     }
 
-    # Check each genre category
-    for genre, keywords in genre_mapping.items():
-        for keyword in keywords:
-            for subject in filtered_subjects:
-                if keyword.lower() in subject:
-                    print(f"Matched genre '{genre}' with keyword '{keyword}' in subject '{subject}'")
-                    return genre
-
-    # Fallback: clean up first meaningful subject
-    for subject in filtered_subjects:
-        if subject and subject not in ignore_list:
-            cleaned = subject.replace('_', ' ').title()
-            if len(cleaned) < 30:  # Avoid overly long genre names
-                print(f"Using fallback genre: '{cleaned}'")
-                return cleaned
 
-    return 'Fiction'
+def remote_lookup(result, lookup):
+    """Fill in what the index missed from OpenLibrary and Google Books; subjects are left for the caller to classify."""
+    title = result.get('title', 'No Title')
+    author_name = result.get('author_name', ['Unknown'])[0]
+    genre, description, pages = lookup['genre'], lookup['description'], lookup['pages']
+
+    with http_client.skipped_hosts() as skipped_hosts:
+        # --- Start every remaining lookup at once, so adding a book costs the slowest call instead of all of them ---
+        work_future = None
+        if not lookup['local_work'] and result.get('key'):
+            work_future = submit_lookup(get_book_details, result['key'])
+        google_future = None
+        if not (genre and genre.lower() not in ['fiction', 'unknown'] and description and pages):
+            google_future = submit_lookup(get_google_books_data, title, author_name)
+
+        # Only hit the editions if neither the search median nor the index had a page count
+        edition_futures, hedge_keys = [], []
+        if not pages:
+            edition_futures, hedge_keys = start_edition_lookups(result.get('edition_key', []))
+
+        # --- 1. Try OpenLibrary for genre ---
+        work_subjects = []
+        validators = {}
+        if work_future:
+            work_details = work_future.result()
+            work_subjects = work_details.get('subjects', [])
+            description = work_details.get('description')
+            validators = {field: work_details.get(field) for field in ('work_etag', 'work_last_modified')}
+
+        # --- 2. Try OpenLibrary for pages ---
+        edition_key = lookup['edition_key']
+        if edition_futures:
+            page_edition, pages = first_edition_pages(edition_futures, hedge_keys)
+            edition_key = page_edition or edition_key
+
+        # --- 3. Fallback to Google Books ---
+        try:
+            google_data = google_future.result() if google_future else {}
+        except Exception as e:
+            print(f"Error fetching Google Books data for {title}: {e}")
+            google_data = {"pages": None, "description": None, "categories": []}
+
+    return dict(lookup, work_subjects=work_subjects, description=description, pages=pages,
+                edition_key=edition_key, google=google_data, validators=validators, skipped_hosts=skipped_hosts)
 
 
 def get_google_books_data(title, author=None):
@@ -351,7 +602,7 @@ def get_google_books_data(title, author=None):
     if author:
         query += f"+inauthor:{author}"
 
-    response = requests.get(
+    response = http_client.get(
         "https://www.googleapis.com/books/v1/volumes",
         params={"q": query, "maxResults": 1, 'key': GOOGLE_API_KEY}
     )
@@ -367,28 +618,874 @@ def get_google_books_data(title, author=None):
     return {"pages": None, "description": None, "categories": []}
 
 
+@bp.cli.command('build-ol-index')
+@click.argument('dumps', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+def build_ol_index_command(dumps):
+    """Load OpenLibrary works/editions/authors dumps (.txt or .txt.gz) into the local lookup index."""
+    start = time.perf_counter()
+    counts = ol_index.build(dumps, progress=lambda c: click.echo(
+        f"  {c['works']} works, {c['editions']} editions, {c['authors']} authors"))
+    click.echo(f"Indexed {sum(counts.values())} records into {ol_index.INDEX_PATH} "
+               f"in {time.perf_counter() - start:.1f}s")
+
+
+# -------------------------------------------- BACKGROUND ENRICHMENT ---------------------------------------------
+def queue_enrichment(book, result):
+    """Persist an enrichment job for a freshly added book. Call submit_job after committing."""
+    job = EnrichmentJob(book_id=book.id, payload=json.dumps(result))
+    db.session.add(job)
+    return job
+
+
+def submit_job(job_id, delay=0):
+    """Run a job on the job pool, in the current app. Needs an app context."""
+    app = current_app._get_current_object()
+    if delay:
+        timer = threading.Timer(delay, job_pool.submit, args=(run_enrichment_job, app, job_id))
+        timer.daemon = True
+        timer.start()
+    else:
+        job_pool.submit(run_enrichment_job, app, job_id)
+
+
+def run_enrichment_job(app, job_id):
+    """Enrich the book behind a job and write the missing fields back to its row."""
+    with app.app_context():
+        # Claim the job, so two workers never enrich the same book
+        claimed = db.session.execute(
+            update(EnrichmentJob)
+            .where(EnrichmentJob.id == job_id, EnrichmentJob.status == 'pending')
+            .values(status='running', attempts=EnrichmentJob.attempts + 1, updated_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            return
+
+        job = db.session.get(EnrichmentJob, job_id)
+        retry_delay = None
+        try:
+            with http_client.skipped_hosts() as skipped_hosts:
+                details = enrich_result(json.loads(job.payload))
+            book = db.session.get(Book, job.book_id, options=[undefer_group('details')])
+            if book:
+                apply_details(book, details, only_missing=True)
+            job.status = 'done'
+            job.last_error = None
+            if skipped_hosts and job.attempts < MAX_JOB_ATTEMPTS:
+                # Keep the partial data, and try again for the rest once the circuit may have closed
+                job.status = 'pending'
+                job.last_error = f"Partial, circuit open for {', '.join(sorted(skipped_hosts))}"
+                retry_delay = http_client.BREAKER_RESET
+        except Exception as e:
+            logger.exception('Enrichment job %s failed', job_id)
+            db.session.rollback()
+            job = db.session.get(EnrichmentJob, job_id)
+            job.last_error = str(e)[:500]
+            retry = job.attempts < MAX_JOB_ATTEMPTS
+            job.status = 'pending' if retry else 'failed'
+            if retry:
+                retry_delay = JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        job.updated_at = datetime.utcnow()
+        job.next_attempt_at = job.updated_at + timedelta(seconds=retry_delay) if retry_delay is not None else None
+        db.session.commit()
+
+        if retry_delay is not None:
+            submit_job(job_id, delay=retry_delay)
+
+
+def resume_enrichment_jobs():
+    """Queue the jobs a previous process left behind, each no earlier than its retry was due."""
+    lease_expired = datetime.utcnow() - timedelta(seconds=JOB_LEASE)
+    db.session.execute(
+        update(EnrichmentJob)
+        .where(EnrichmentJob.status == 'running', EnrichmentJob.updated_at < lease_expired)
+        .values(status='pending')
+    )
+    db.session.commit()
+    pending = db.session.execute(
+        db.select(EnrichmentJob.id, EnrichmentJob.next_attempt_at).where(EnrichmentJob.status == 'pending')
+    ).all()
+    now = datetime.utcnow()
+    for job_id, next_attempt_at in pending:
+        submit_job(job_id, delay=max(0.0, (next_attempt_at - now).total_seconds()) if next_attempt_at else 0)
+
+
+@bp.before_app_request
+def resume_jobs_on_first_request():
+    """Resume left-over jobs once per process, on its first request.
+
+    Not at import or in create_app: startup stays free of database work, and a
+    preloaded gunicorn master never starts pool threads its workers would lose in the fork.
+    """
+    global jobs_resumed
+    with jobs_resumed_lock:
+        if jobs_resumed:
+            return
+        jobs_resumed = True
+    resume_enrichment_jobs()
+
+
+def metadata_is_stale(book):
+    if not book.work_key:
+        return False
+    return book.revalidated_at is None or datetime.utcnow() - book.revalidated_at > METADATA_MAX_AGE
+
+
+def start_revalidation(book_id):
+    """Queue revalidate_book unless this process is already rechecking the book."""
+    with revalidating_lock:
+        if book_id in revalidating:
+            return
+        revalidating.add(book_id)
+    job_pool.submit(revalidate_book, current_app._get_current_object(), book_id)
+
+
+def revalidate_book(app, book_id):
+    """Ask OpenLibrary whether a book's work changed since we stored it, and pick up a new description if so."""
+    try:
+        with app.app_context():
+            book = db.session.get(Book, book_id, options=[undefer_group('details')])
+            if not book or not book.work_key:
+                return
+            try:
+                response = http_client.revalidate(f"https://openlibrary.org/works/{book.work_key}.json",
+                                                  etag=book.work_etag, last_modified=book.work_last_modified)
+            except RequestException as e:
+                print(f"Error revalidating {book.work_key}: {e}")
+                return
+
+            if response.status_code == 200:
+                work_data = response.json()
+                desc_data = work_data.get('description')
+                description = desc_data.get('value') if isinstance(desc_data, dict) else desc_data
+                if description and description != book.description:
+                    book.description = description
+                if not book.genre and work_data.get('subjects'):
+                    book.genre = categorize_genre(work_data['subjects'])
+                book.work_etag = response.headers.get('ETag')
+                book.work_last_modified = response.headers.get('Last-Modified')
+                book.enriched_at = datetime.utcnow()
+            elif response.status_code != 304:
+                return
+            book.revalidated_at = datetime.utcnow()
+            db.session.commit()
+    finally:
+        with revalidating_lock:
+            revalidating.discard(book_id)
+
+
+def enrichment_status(book_id):
+    job = db.session.execute(
+        db.select(EnrichmentJob).where(EnrichmentJob.book_id == book_id).order_by(EnrichmentJob.id.desc())
+    ).scalars().first()
+    return job.status if job else 'done'
+
+
+# ------------------------------------------------- BULK IMPORT ---------------------------------------------------
+def search_import_row(row):
+    """The OpenLibrary search doc for an import row, or None."""
+    try:
+        results = search_openlibrary(importer.search_query(row), limit=1)
+    except Exception as e:
+        print(f"Error searching for import row {row}: {e}")
+        results = []
+    return results[0] if results else None
+
+
+def resolve_import_row(row, result, details):
+    """An unsaved Book for an import row, its search doc and enrich_result's details, or None if we can't place it."""
+    if result:
+        book = stub_book_from_result(result)
+        apply_details(book, details)
+    elif row.get('title'):
+        book = Book(title=row['title'], author=row.get('author') or 'Unknown', year=0)
+    else:
+        return None
+
+    # Carry over what the user already knows about the book
+    book.star_rating = row.get('star_rating')
+    book.date_finished = row.get('date_finished')
+    if row.get('shelf') == importer.SHELF_CURRENT:
+        book.date_started = date.today()
+    elif row.get('shelf') == importer.SHELF_READ and not book.date_finished:
+        book.date_finished = date.today()
+    return book
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_books(stream, checkpoint, batch_size=IMPORT_BATCH_SIZE, workers=IMPORT_WORKERS):
+    """Import every row after the checkpoint, one transaction per batch. Returns (rows processed, seconds)."""
+    rows = importer.read_rows(stream)
+    for _ in range(checkpoint.done):
+        if next(rows, None) is None:
+            break
+
+    processed = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in batched(rows, batch_size):
+            results = list(pool.map(search_import_row, batch))
+            # Rows whose book is already in the library are skipped before paying for their enrichment
+            owned = owned_books([result for result in results if result])
+            todo = [(row, result) for row, result in zip(batch, results)
+                    if not (result and openlibrary_search.olid_of(result) in owned)]
+            # Enriched as one batch, so the whole batch's subjects are classified together
+            found = [result for _, result in todo if result]
+            details = iter(details for details, _ in enrich_results(found, pool))
+            books = [resolve_import_row(row, result, next(details) if result else None) for row, result in todo]
+            books = [book for book in books if book]
+
+            # Book.title is unique, so drop anything already in the library (or twice in this batch)
+            titles = [book.title for book in books]
+            seen = set(db.session.execute(db.select(Book.title).where(Book.title.in_(titles))).scalars())
+            new_books = []
+            for book in books:
+                if book.title not in seen:
+                    seen.add(book.title)
+                    new_books.append(book)
+
+            db.session.add_all(new_books)
+            db.session.commit()
+
+            checkpoint.done += len(batch)
+            checkpoint.imported += len(new_books)
+            checkpoint.skipped += len(batch) - len(new_books)
+            checkpoint.save()
+            processed += len(batch)
+            print(f"Import: {checkpoint.done} rows done, {checkpoint.imported} books added")
+
+    checkpoint.finished = True
+    checkpoint.save()
+    return processed, time.perf_counter() - start
+
+
+def run_import_file(app, path):
+    """Background thread target for uploaded import files."""
+    try:
+        with app.app_context(), importer.open_text(path) as stream:
+            processed, elapsed = import_books(stream, importer.Checkpoint(f"{path}.checkpoint.json"))
+            print(f"Imported {processed} rows from {path} in {elapsed:.1f}s "
+                  f"({processed / elapsed if elapsed else 0:.2f} books/sec)")
+    except Exception as e:
+        print(f"Import of {path} failed: {e}")
+    finally:
+        with running_imports_lock:
+            running_imports.discard(path)
+
+
+def start_import(path):
+    with running_imports_lock:
+        if path in running_imports:
+            return
+        running_imports.add(path)
+    threading.Thread(target=run_import_file, args=(current_app._get_current_object(), path), daemon=True).start()
+
+
+def import_progress():
+    """Checkpoint state of every uploaded import file, newest first."""
+    if not os.path.isdir(IMPORT_DIR):
+        return []
+    imports = []
+    for name in os.listdir(IMPORT_DIR):
+        if name.endswith('.checkpoint.json'):
+            path = os.path.join(IMPORT_DIR, name[:-len('.checkpoint.json')])
+            checkpoint = importer.Checkpoint(os.path.join(IMPORT_DIR, name))
+            imports.append({
+                'name': os.path.basename(path),
+                'done': checkpoint.done,
+                'imported': checkpoint.imported,
+                'skipped': checkpoint.skipped,
+                'finished': checkpoint.finished,
+                'running': path in running_imports,
+                'modified': os.path.getmtime(os.path.join(IMPORT_DIR, name)),
+            })
+    return sorted(imports, key=lambda i: i['modified'], reverse=True)
+
+
+@bp.cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Books per transaction.')
+@click.option('--workers', default=IMPORT_WORKERS, show_default=True, help='Books looked up at the same time.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first row.')
+def import_books_command(path, batch_size, workers, restart):
+    """Import a Goodreads CSV export or a list of OpenLibrary IDs."""
+    checkpoint = importer.Checkpoint(f"{path}.checkpoint.json")
+    if restart:
+        checkpoint.reset()
+    elif checkpoint.done:
+        click.echo(f"Resuming after row {checkpoint.done}")
+
+    with importer.open_text(path) as stream:
+        processed, elapsed = import_books(stream, checkpoint, batch_size=batch_size, workers=workers)
+
+    click.echo(f"Processed {processed} rows in {elapsed:.1f}s "
+               f"({processed / elapsed if elapsed else 0:.2f} books/sec): "
+               f"{checkpoint.imported} books added, {checkpoint.skipped} skipped in total")
+
+
+# ---------------------------------------------------- EXPORT ----------------------------------------------------
+# Everything the user entered or we looked up, but not the bookkeeping (match key, HTTP validators)
+EXPORT_COLUMNS = (Book.id, Book.title, Book.author, Book.year, Book.star_rating, Book.spice_rating, Book.review,
+                  Book.date_started, Book.date_finished, Book.pages, Book.genre, Book.description, Book.img_url,
+                  Book.work_key, Book.edition_key, Book.cover_id, Book.enriched_at)
+EXPORT_FIELDS = [(column.key, column.type.python_type) for column in EXPORT_COLUMNS]
+
+
+def book_export_chunks(chunk_size=EXPORT_CHUNK_SIZE):
+    """The whole library in id order, `chunk_size` rows at a time from a streaming cursor."""
+    result = db.session.execute(
+        db.select(*EXPORT_COLUMNS).order_by(Book.id).execution_options(yield_per=chunk_size)
+    )
+    yield from result.partitions()
+
+
+@bp.cli.command('export-books')
+@click.argument('fmt', metavar='FORMAT', type=click.Choice(list(exporter.FORMATS)))
+@click.option('--output', type=click.Path(dir_okay=False), help='Defaults to books.<FORMAT>.')
+@click.option('--chunk-size', default=EXPORT_CHUNK_SIZE, show_default=True, help='Rows fetched at a time.')
+def export_books_command(fmt, output, chunk_size):
+    """Write the whole library to a CSV, JSON Lines or Parquet file."""
+    if not exporter.available(fmt):
+        raise click.ClickException(f"{fmt} export needs pyarrow: pip install pyarrow")
+    output = output or f"books.{fmt}"
+    start = time.perf_counter()
+    written = 0
+    with open(output, 'wb') as f:
+        for data in exporter.write(fmt, EXPORT_FIELDS, book_export_chunks(chunk_size)):
+            f.write(data)
+            written += len(data)
+    click.echo(f"Wrote {written / 1024:.0f} KiB to {output} in {time.perf_counter() - start:.1f}s")
+
+
+# --------------------------------------------------- BACKFILL ---------------------------------------------------
+def backfill_doc(book):
+    """The search doc to re-enrich a book from, or None if we can't tell which work it is."""
+    if book.work_key:
+        return search_import_row({'olid': book.work_key})
+    result = search_import_row({'title': book.title, 'author': book.author})
+    # A title search can find another book; only trust it when title and author match ours
+    if result and library_key(result.get('title', ''), result.get('author_name', [''])[0]) == \
+            library_key(book.title, book.author):
+        return result
+    return None
+
+
+def backfill_lookups(books, pool):
+    """Search docs for books and enrich them as one batch. Yields (doc or None, details, hosts skipped) per book."""
+    def tracked_doc(book):
+        with http_client.skipped_hosts() as skipped_hosts:
+            return backfill_doc(book), skipped_hosts
+
+    docs = list(pool.map(tracked_doc, books))
+    enriched = iter(enrich_results([result for result, _ in docs if result], pool))
+    for result, skipped_hosts in docs:
+        details, enrich_skipped = next(enriched) if result else ({}, set())
+        yield result, details, skipped_hosts | enrich_skipped
+
+
+def backfill_changes(book, result, details, refresh=False):
+    """The columns that would change on a book, given its search doc and enrich_result's details.
+
+    Only empty columns are filled in, unless refresh, which also replaces values the lookups now disagree with.
+    """
+    changes = {}
+    if result:
+        details = dict(details, work_key=ol_index.short_key(result.get('key')))
+        for field in BACKFILL_FIELDS:
+            value, current = details.get(field), getattr(book, field)
+            if value and value != current and (refresh or not current):
+                changes[field] = value
+    return changes
+
+
+def backfill_books(enriched_before, refresh=False, chunk_size=BACKFILL_CHUNK_SIZE, workers=BACKFILL_WORKERS,
+                   limit=None, dry_run=False):
+    """Re-enrich the books backfill_query selects, one transaction per chunk. Returns (books checked, changes)."""
+    checked = 0
+    changes = Counter()  # field -> books where it changes, plus 'books' for books with any change
+    after_id = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while limit is None or checked < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - checked)
+            books = db.session.execute(backfill_query(enriched_before, after_id, size, refresh)).all()
+            if not books:
+                break
+            after_id = books[-1].id
+
+            now = datetime.utcnow()
+            updates = []
+            for book, (result, details, skipped_hosts) in zip(books, backfill_lookups(books, pool)):
+                changed = backfill_changes(book, result, details, refresh)
+                complete = not skipped_hosts
+                if changed:
+                    changes.update(changed.keys())
+                    changes['books'] += 1
+                # The marker keeps the next run off this book until it is stale again, unless a lookup was skipped
+                values = dict(changed, enriched_at=now) if complete else changed
+                if values:
+                    updates.append(dict(values, id=book.id))
+
+            # Bulk update by primary key: sorted, rows changing the same columns share one executemany
+            if updates and not dry_run:
+                updates.sort(key=lambda values: sorted(values))
+                db.session.execute(update(Book), updates)
+                db.session.commit()
+            checked += len(books)
+            print(f"Backfill: {checked} books checked, {changes['books']} "
+                  f"{'would change' if dry_run else 'changed'}")
+
+    # Bulk updates skip the flush hooks that keep the stats rollup current
+    if not dry_run and (changes['pages'] or changes['genre']):
+        rebuild_stats()
+    return checked, changes
+
+
+@bp.cli.command('backfill')
+@click.option('--older-than', default=METADATA_MAX_AGE.days, show_default=True,
+              help='Skip books enriched fewer than this many days ago.')
+@click.option('--refresh', is_flag=True,
+              help='Also re-enrich complete books, replacing values that changed (e.g. after genre mapping fixes).')
+@click.option('--chunk-size', default=BACKFILL_CHUNK_SIZE, show_default=True, help='Books per transaction.')
+@click.option('--workers', default=BACKFILL_WORKERS, show_default=True, help='Books looked up at the same time.')
+@click.option('--limit', type=int, help='Stop after this many books.')
+@click.option('--dry-run', is_flag=True, help='Look the books up, but only report what would change.')
+def backfill_command(older_than, refresh, chunk_size, workers, limit, dry_run):
+    """Fill in the pages, genre and description that lookups missed when books were added."""
+    enriched_before = datetime.utcnow() - timedelta(days=older_than)
+    candidates = db.session.execute(
+        db.select(func.count()).select_from(backfill_query(enriched_before, refresh=refresh).subquery())
+    ).scalar()
+    click.echo(f"{candidates} books to check" + (f", stopping after {limit}" if limit else ""))
+
+    start = time.perf_counter()
+    checked, changes = backfill_books(enriched_before, refresh=refresh, chunk_size=chunk_size, workers=workers,
+                                      limit=limit, dry_run=dry_run)
+    fields = ', '.join(f"{field} {changes[field]}" for field in BACKFILL_FIELDS if changes[field])
+    click.echo(f"Checked {checked} books in {time.perf_counter() - start:.1f}s: {changes['books']} "
+               f"{'would change' if dry_run else 'changed'}" + (f" ({fields})" if fields else ""))
+
+
+# ------------------------------------------------- READING STATS -------------------------------------------------
+STATS_FIELDS = ('date_finished', 'pages', 'genre', 'star_rating', 'spice_rating')
+PAGE_BUCKETS = ['≤300 pages', '301-500 pages', '500+ pages', 'Unknown']
+RATING_LABELS = ['1', '1.5', '2', '2.5', '3', '3.5', '4', '4.5', '5']
+
+
+def page_bucket(pages):
+    if not pages or pages <= 0:
+        return 'Unknown'
+    if pages <= 300:
+        return '≤300 pages'
+    if pages <= 500:
+        return '301-500 pages'
+    return '500+ pages'
+
+
+def rating_bucket(rating):
+    # Same labels the charts use, so 4.0 is '4' and 3.5 is '3.5'
+    return f"{rating:g}" if rating is not None else None
+
+
+def stats_contributions(values):
+    """The rollup rows one book counts towards, with the amounts it adds to each."""
+    if not values.get('date_finished'):
+        return {}
+    pages = values['pages'] if values.get('pages') and values['pages'] > 0 else 0
+    rating = values.get('star_rating')
+    amounts = (1, pages, rating or 0, 1 if rating is not None else 0)
+
+    finished = values['date_finished']
+    keys = [
+        ('total', 'all'),
+        ('genre', clean_genre([values['genre']]) if values.get('genre') else 'Unknown'),
+        ('pages', page_bucket(values.get('pages'))),
+        ('month', f"{finished.year}-{finished.month:02d}"),
+    ]
+    if rating is not None:
+        keys.append(('star', rating_bucket(rating)))
+    if values.get('spice_rating') is not None:
+        keys.append(('spice', rating_bucket(values['spice_rating'])))
+    return {key: amounts for key in keys}
+
+
+def book_values_before_flush(book):
+    """Stats fields of a book as they are in the database (active_history keeps the old values around)."""
+    state = inspect(book)
+    values = {}
+    for field in STATS_FIELDS:
+        history = state.attrs[field].history
+        if history.has_changes():
+            values[field] = history.deleted[0] if history.deleted else None
+        else:
+            values[field] = getattr(book, field)
+    return values
+
+
+def add_deltas(deltas, contributions, sign):
+    for key, amounts in contributions.items():
+        current = deltas.get(key, (0, 0, 0, 0))
+        deltas[key] = tuple(c + sign * a for c, a in zip(current, amounts))
+
+
+@event.listens_for(Session, 'before_flush')
+def update_stats_rollup(session, flush_context, instances):
+    """Fold the Book changes about to be flushed into the rollup, inside the same transaction."""
+    deltas = {}
+    for book in session.new:
+        if isinstance(book, Book):
+            add_deltas(deltas, stats_contributions({f: getattr(book, f) for f in STATS_FIELDS}), 1)
+    for book in session.deleted:
+        if isinstance(book, Book):
+            add_deltas(deltas, stats_contributions(book_values_before_flush(book)), -1)
+    for book in session.dirty:
+        if isinstance(book, Book) and session.is_modified(book) and book not in session.deleted:
+            add_deltas(deltas, stats_contributions(book_values_before_flush(book)), -1)
+            add_deltas(deltas, stats_contributions({f: getattr(book, f) for f in STATS_FIELDS}), 1)
+
+    rows = [dict(dimension=dimension, bucket=bucket, books=books, pages=pages,
+                 rating_sum=rating_sum, rating_count=rating_count)
+            for (dimension, bucket), (books, pages, rating_sum, rating_count) in deltas.items()
+            if any((books, pages, rating_sum, rating_count))]
+    if rows:
+        # One upsert that adds the deltas, instead of an UPDATE followed by an INSERT for new slices
+        upsert = stats_upsert(session.connection().dialect.name)
+        session.execute(upsert, rows)
+
+
+def stats_upsert(dialect):
+    """INSERT into the rollup that adds to the counters of a slice that already has a row."""
+    statement = (postgresql if dialect == 'postgresql' else sqlite).insert(StatsRollup)
+    return statement.on_conflict_do_update(
+        index_elements=[StatsRollup.dimension, StatsRollup.bucket],
+        set_={column: getattr(StatsRollup, column) + getattr(statement.excluded, column)
+              for column in ('books', 'pages', 'rating_sum', 'rating_count')}
+    )
+
+
+def rebuild_stats():
+    """Recompute the whole rollup with GROUP BY queries, e.g. after the genre rules changed."""
+    finished = Book.date_finished.isnot(None)
+    measures = (
+        func.count(Book.id),
+        func.coalesce(func.sum(case((Book.pages > 0, Book.pages), else_=0)), 0),
+        func.coalesce(func.sum(Book.star_rating), 0),
+        func.count(Book.star_rating),
+    )
+    pages_expr = case(
+        (Book.pages.is_(None) | (Book.pages <= 0), 'Unknown'),
+        (Book.pages <= 300, '≤300 pages'),
+        (Book.pages <= 500, '301-500 pages'),
+        else_='500+ pages'
+    )
+    groupings = {
+        'total': [],
+        'genre': [Book.genre],
+        'pages': [pages_expr],
+        'star': [Book.star_rating],
+        'spice': [Book.spice_rating],
+        'month': [extract('year', Book.date_finished), extract('month', Book.date_finished)],
+    }
+
+    rows = {}
+    for dimension, group_by in groupings.items():
+        query = db.select(*group_by, *measures).where(finished)
+        if group_by:
+            query = query.group_by(*group_by)
+        grouped = db.session.execute(query).all()
+        if dimension == 'genre':
+            # Every stored genre is cleaned up in one clean_genres pass
+            genre_buckets = clean_genres([[row[0]] if row[0] else [] for row in grouped])
+        for index, row in enumerate(grouped):
+            keys, amounts = row[:len(group_by)], tuple(row[len(group_by):])
+            if dimension == 'total':
+                bucket = 'all'
+            elif dimension == 'genre':
+                bucket = genre_buckets[index] or 'Unknown'
+            elif dimension in ('star', 'spice'):
+                if keys[0] is None:
+                    continue
+                bucket = rating_bucket(keys[0])
+            elif dimension == 'month':
+                bucket = f"{int(keys[0])}-{int(keys[1]):02d}"
+            else:
+                bucket = keys[0]
+            # Several raw genres can clean up to the same bucket
+            current = rows.get((dimension, bucket), (0, 0, 0, 0))
+            rows[(dimension, bucket)] = tuple(c + a for c, a in zip(current, amounts))
+
+    StatsRollup.query.delete()
+    db.session.add_all(StatsRollup(dimension=dimension, bucket=bucket, books=books, pages=pages,
+                                   rating_sum=rating_sum, rating_count=rating_count)
+                       for (dimension, bucket), (books, pages, rating_sum, rating_count) in rows.items())
+    db.session.commit()
+    # The rollup can change here without any Book write, so cached /stats pages have to go explicitly
+    page_cache.invalidate()
+
+
+def load_stats(year):
+    """Everything the stats page draws, straight from the rollup table."""
+    rollup = db.session.execute(db.select(StatsRollup)).scalars().all()
+    if not rollup and db.session.execute(db.select(Book.id).where(Book.date_finished.isnot(None)).limit(1)).first():
+        rebuild_stats()
+        rollup = db.session.execute(db.select(StatsRollup)).scalars().all()
+
+    counts = {}
+    total = None
+    for row in rollup:
+        if row.dimension == 'total':
+            total = row
+        elif row.books:
+            counts.setdefault(row.dimension, {})[row.bucket] = row.books
+
+    # Labels and counts as parallel lists: jsonify sorts object keys, which would scramble the bucket order
+    def chart(dimension, buckets):
+        return {'labels': list(buckets), 'counts': [counts.get(dimension, {}).get(bucket, 0) for bucket in buckets]}
+
+    genres = counts.get('genre', {})
+    return {
+        'total_books': total.books if total else 0,
+        'avg_rating': round(total.rating_sum / total.rating_count, 1) if total and total.rating_count else None,
+        'total_pages': total.pages if total else 0,
+        'genres': chart('genre', sorted(genres, key=lambda genre: (-genres[genre], genre))),
+        'pages': chart('pages', PAGE_BUCKETS),
+        'star': chart('star', RATING_LABELS),
+        'spice': chart('spice', RATING_LABELS),
+        'months': chart('month', [f"{year}-{month:02d}" for month in range(1, 13)]),
+    }
+
+
+def stats_slice_filter(dimension, bucket):
+    """SQL filter for the finished books behind one chart slice, or None if the slice is unknown."""
+    if dimension == 'genre':
+        if bucket == 'Unknown':
+            return Book.genre.is_(None) | (Book.genre == '')
+        raw_genres = db.session.execute(
+            db.select(Book.genre).where(Book.date_finished.isnot(None), Book.genre.isnot(None)).distinct()
+        ).scalars().all()
+        raw_genres = [genre for genre in raw_genres if genre]
+        return Book.genre.in_([genre for genre, cleaned in zip(raw_genres, clean_genres([[g] for g in raw_genres]))
+                               if cleaned == bucket])
+    if dimension == 'pages':
+        return {
+            '≤300 pages': (Book.pages > 0) & (Book.pages <= 300),
+            '301-500 pages': (Book.pages > 300) & (Book.pages <= 500),
+            '500+ pages': Book.pages > 500,
+            'Unknown': Book.pages.is_(None) | (Book.pages <= 0),
+        }.get(bucket)
+    if dimension in ('star', 'spice') and bucket in RATING_LABELS:
+        column = Book.star_rating if dimension == 'star' else Book.spice_rating
+        return column == float(bucket)
+    if dimension == 'month':
+        try:
+            year, month = (int(part) for part in bucket.split('-'))
+            start = date(year, month, 1)
+        except ValueError:
+            return None
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return (Book.date_finished >= start) & (Book.date_finished < end)
+    return None
+
+
+@bp.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the /stats rollup table from the Book table."""
+    rebuild_stats()
+    click.echo("Stats rollup rebuilt")
+
+
+# --------------------------------------------------- QUERIES ---------------------------------------------------
+# Shared by the routes and by check-query-plans, so the plans we check are the ones we run.
+# The list queries select only the columns their page shows and return plain rows instead of Book
+# objects, so a long TBR never pulls descriptions into memory or into the session's identity map.
+CARD_COLUMNS = (Book.id, Book.title, Book.author, Book.year, Book.img_url)
+SHELF_COLUMNS = CARD_COLUMNS + (Book.date_started,)
+FINISHED_COLUMNS = CARD_COLUMNS + (Book.star_rating, Book.spice_rating, Book.review, Book.date_finished)
+
+
+def currently_reading_query():
+    return db.select(*SHELF_COLUMNS).where(Book.date_started.isnot(None), Book.date_finished.is_(None))
+
+
+def tbr_query():
+    return db.select(*CARD_COLUMNS).where(Book.date_started.is_(None), Book.date_finished.is_(None))
+
+
+def finished_in_year_query(year):
+    return db.select(func.count(Book.id)).where(
+        Book.date_finished.isnot(None),
+        Book.date_finished.between(date(year, 1, 1), date(year, 12, 31))
+    )
+
+
+def recently_read_query():
+    return db.select(*FINISHED_COLUMNS).where(Book.date_finished.isnot(None)).order_by(Book.date_finished.desc())
+
+
+def top_books_query(after=None, limit=None):
+    """Finished books, best first; `after` is the (rating, id) keyset cursor of the previous page."""
+    # Unrated books go last; the id keeps the order (and so the page cursor) stable between equal ratings.
+    # No rank column: numbering every finished book would read them all on every page, the route counts on
+    # from the rank the cursor carries instead
+    rating_key = func.coalesce(Book.star_rating, UNRATED)
+    query = (db.select(*FINISHED_COLUMNS, rating_key.label('rating_key'))
+             .where(Book.date_finished.isnot(None))
+             .order_by(desc(rating_key), Book.id))
+    if after:
+        after_rating, after_id = after
+        query = query.where((rating_key < after_rating) | ((rating_key == after_rating) & (Book.id > after_id)))
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def backfill_query(enriched_before, after_id=0, limit=None, refresh=False):
+    """Books not enriched since `enriched_before` that miss a field (any such book with refresh), in id order."""
+    query = (db.select(Book.id, Book.title, Book.author, Book.work_key, Book.edition_key, Book.pages, Book.genre,
+                       Book.description)
+             .where(Book.id > after_id, or_(Book.enriched_at.is_(None), Book.enriched_at < enriched_before))
+             .order_by(Book.id))
+    if not refresh:
+        query = query.where(MISSING_METADATA)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def owned_books_query(work_keys, match_keys):
+    return (db.select(Book.id, Book.work_key, Book.match_key)
+            .where(or_(Book.work_key.in_(work_keys), Book.match_key.in_(match_keys))))
+
+
+def search_terms(query):
+    # Every word must match, the last one as a prefix so results show up while typing
+    return re.findall(r'\w+', query.lower())[:10]
+
+
+def search_library(query, limit=SEARCH_LIMIT):
+    """Books matching a free-text query, best match first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    dialect = db.session.connection().dialect.name
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+        # bm25 weights follow SEARCH_COLUMNS: title and author count most
+        ranked = db.session.execute(text(
+            "SELECT rowid FROM book_fts WHERE book_fts MATCH :match "
+            "ORDER BY bm25(book_fts, 10.0, 8.0, 3.0, 1.0, 1.0) LIMIT :limit"
+        ), {'match': match, 'limit': limit}).scalars().all()
+    elif dialect == 'postgresql':
+        ts_query = ' & '.join(terms[:-1] + [f"{terms[-1]}:*"])
+        ranked = db.session.execute(text(
+            "SELECT id FROM book WHERE search_vector @@ to_tsquery('english', :query) "
+            "ORDER BY ts_rank(search_vector, to_tsquery('english', :query)) DESC LIMIT :limit"
+        ), {'query': ts_query, 'limit': limit}).scalars().all()
+    else:
+        pattern = f"%{query}%"
+        ranked = db.session.execute(
+            db.select(Book.id).where(Book.title.ilike(pattern) | Book.author.ilike(pattern)).limit(limit)
+        ).scalars().all()
+
+    books = {book.id: book for book in db.session.execute(db.select(Book).where(Book.id.in_(ranked))).scalars()}
+    return [books[book_id] for book_id in ranked if book_id in books]
+
+
+def hot_queries():
+    year = datetime.now().year
+    return {
+        'currently-reading': currently_reading_query().limit(5),
+        'tbr': tbr_query(),
+        'finished-in-year': finished_in_year_query(year),
+        'recently-finished': recently_read_query().limit(5),
+        'top-rated': top_books_query(limit=TOP_BOOKS_PAGE_SIZE + 1),
+        'top-rated-next-page': top_books_query(after=(4.0, 1), limit=TOP_BOOKS_PAGE_SIZE + 1),
+        'already-owned': owned_books_query(['OL45804W'], [library_key('Fourth Wing', 'Rebecca Yarros')]),
+        'backfill': backfill_query(datetime.utcnow() - METADATA_MAX_AGE, limit=BACKFILL_CHUNK_SIZE),
+    }
+
+
+def full_table_scans(query):
+    """Tables the database would read front to back for this query."""
+    connection = db.session.connection()
+    sql = query.compile(connection, compile_kwargs={'literal_binds': True})
+    if connection.dialect.name == 'sqlite':
+        plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+        # 'SCAN book USING INDEX ...' is an index walk, a bare 'SCAN book' reads the whole table
+        return [row[-1] for row in plan
+                if row[-1].startswith('SCAN ') and 'USING' not in row[-1] and row[-1].split()[1] in db.metadata.tables]
+    if connection.dialect.name == 'postgresql':
+        # Tiny tables make a sequential scan the cheapest plan, so forbid it to see which index would be used
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+        scans = []
+
+        def walk(node):
+            if node.get('Node Type') == 'Seq Scan':
+                scans.append(f"Seq Scan on {node.get('Relation Name')}")
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+        return scans
+    raise click.ClickException(f"No query plan check for {connection.dialect.name}")
+
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if one of the hot list queries falls back to a full table scan."""
+    failures = 0
+    for name, query in hot_queries().items():
+        scans = full_table_scans(query)
+        db.session.rollback()
+        if scans:
+            failures += 1
+            click.echo(f"FAIL {name}: {'; '.join(scans)}")
+        else:
+            click.echo(f"ok   {name}")
+    if failures:
+        raise SystemExit(1)
+
+
+@bp.cli.command('build-assets')
+@click.option('--force', is_flag=True, help='Rebuild every asset, not just the changed ones.')
+def build_assets_command(force):
+    """Write fingerprinted, minified and precompressed copies of the static files to static/dist."""
+    built = assets.build(force=force)
+    click.echo(f"{len(built)} assets up to date in {assets.DIST_DIR}")
+
+
+@bp.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create missing tables and apply pending schema migrations."""
+    upgrade_schema()
+    click.echo("Database is up to date")
+
 
 # -------------------------------------------------- ROUTES ------------------------------------------------------
-@app.route("/")
+@bp.route("/")
+@page_cache.cached_page
 def home():
     goal = 50
     current_year = datetime.now().year
 
-    read_books = Book.query.filter(
-        Book.date_finished.isnot(None),
-        Book.date_finished.between(f"{current_year}-01-01", f"{current_year}-12-31")
-    ).count()
+    read_books = db.session.execute(finished_in_year_query(current_year)).scalar()
 
     progress = int((read_books / goal) * 100) if goal > 0 else 0
 
-    currently_reading = Book.query.filter(
-        Book.date_started.isnot(None),
-        Book.date_finished.is_(None)
-    ).limit(5).all()
+    currently_reading = db.session.execute(currently_reading_query().limit(5)).all()
 
-    recently_read = Book.query.filter(
-        Book.date_finished.isnot(None)
-    ).order_by(Book.date_finished.desc()).limit(5).all()
+    recently_read = db.session.execute(recently_read_query().limit(5)).all()
 
     return render_template(
         "home.html",
@@ -400,29 +1497,43 @@ def home():
     )
 
 
-@app.route("/top-books")
+@bp.route("/top-books")
+@page_cache.cached_page
 def top_books():
-    read_books = db.session.query(Book).filter(Book.date_finished.isnot(None)).order_by(desc(Book.star_rating)).all()
-    for rank, book in enumerate(read_books, start=1):
-        book.ranking = rank
-    db.session.commit()
-    return render_template("index.html", books = read_books)
-
-
-@app.route('/tbr')
+    # Keyset pagination: ?after=<rating>:<id>:<rank> of the last book on the previous page
+    after = request.args.get('after')
+    cursor = None
+    rank_offset = 0
+    if after:
+        try:
+            rating, book_id, rank_offset = after.split(':')
+            cursor = float(rating), int(book_id)
+            rank_offset = int(rank_offset)
+        except ValueError:
+            return redirect(url_for('books.top_books'))
+
+    rows = db.session.execute(top_books_query(after=cursor, limit=TOP_BOOKS_PAGE_SIZE + 1)).all()
+    next_after = None
+    if len(rows) > TOP_BOOKS_PAGE_SIZE:
+        rows = rows[:TOP_BOOKS_PAGE_SIZE]
+        next_after = f"{rows[-1].rating_key:g}:{rows[-1].id}:{rank_offset + len(rows)}"
+
+    ranked_books = [(row, rank_offset + position) for position, row in enumerate(rows, start=1)]
+    return render_template("index.html", books=ranked_books, next_after=next_after, after=after)
+
+
+@bp.route('/tbr')
+@page_cache.cached_page
 def tbr():
-    tbr_books = db.session.query(Book).filter(
-        Book.date_started.is_(None),
-        Book.date_finished.is_(None)
-    ).all()
+    tbr_books = db.session.execute(tbr_query()).all()
     return render_template('tbr.html', books=tbr_books)
 
 
-@app.route('/edit', methods=['GET', 'POST'])
+@bp.route('/edit', methods=['GET', 'POST'])
 def edit():
     form = RateBookForm()
     book_id = request.args.get('id')
-    book_to_update = db.get_or_404(Book, book_id)
+    book_to_update = db.get_or_404(Book, book_id, options=[undefer_group('details')])
 
     if form.validate_on_submit():
         book_to_update.star_rating = float(form.star_rating.data)
@@ -431,47 +1542,81 @@ def edit():
         book_to_update.date_started = form.date_started.data
         book_to_update.date_finished = form.date_finished.data
         db.session.commit()
-        return redirect(url_for('home'))
+        return redirect(url_for('books.home'))
     return render_template('edit.html', form=form, book=book_to_update)
 
 
-@app.route("/delete/<string:target>")
+@bp.route("/delete/<string:target>")
 def delete(target):
     book_id = request.args.get('id')
     book = db.get_or_404(Book, book_id)
+    EnrichmentJob.query.filter_by(book_id=book.id).delete()
     db.session.delete(book)
     db.session.commit()
 
     # Redirect logic
     if target == "tbr":
-        return redirect(url_for('tbr'))
+        return redirect(url_for('books.tbr'))
     elif target == "top":
-        return redirect(url_for('top_books'))
+        return redirect(url_for('books.top_books'))
     else:
-        return redirect(url_for('home'))
+        return redirect(url_for('books.home'))
 
-@app.route("/add", methods=['GET', 'POST'])
+@bp.route("/add", methods=['GET', 'POST'])
 def add():
     form = AddBookForm()
     target = request.args.get('target', None)
     if form.validate_on_submit():
         results = search_openlibrary(form.title.data)
         if not results:
-            return redirect(url_for('home'))
-        return render_template("select.html", results=results, target=target)
+            return redirect(url_for('books.home'))
+        return render_template("select.html", results=results, target=target, owned=owned_books(results))
     return render_template("add.html", form=form, target=target)
 
 
-@app.route('/tbr-to-cr', methods=['GET', 'POST'])
+@bp.route('/import', methods=['GET', 'POST'])
+def import_library():
+    form = ImportBooksForm()
+    if form.validate_on_submit():
+        # Stream the upload to disk, named after its hash so uploading the same file again resumes it
+        os.makedirs(IMPORT_DIR, exist_ok=True)
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(IMPORT_DIR, f"upload-{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: form.file.data.stream.read(64 * 1024), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        path = os.path.join(IMPORT_DIR, f"{digest.hexdigest()[:16]}.txt")
+        os.replace(tmp_path, path)
+        start_import(path)
+        return redirect(url_for('books.import_library'))
+    return render_template('import.html', form=form, imports=import_progress(),
+                           export_formats=[fmt for fmt in exporter.FORMATS if exporter.available(fmt)])
+
+
+@bp.route('/api/search-suggest')
+def search_suggest():
+    query = request.args.get('q', '').strip()
+    if len(query) < SUGGEST_MIN_CHARS:
+        return jsonify([])
+    return jsonify([{
+        'olid': openlibrary_search.olid_of(doc),
+        'title': doc.get('title'),
+        'author': doc.get('author_name', [None])[0],
+        'year': doc.get('first_publish_year'),
+    } for doc in search_openlibrary(query, limit=SUGGEST_LIMIT)])
+
+
+@bp.route('/tbr-to-cr', methods=['GET', 'POST'])
 def tbr_to_cr():
     olid = request.args.get('id')
     book = db.session.get(Book, olid)
     book.date_started = date.today()
     db.session.commit()
-    return redirect(url_for('home'))
+    return redirect(url_for('books.home'))
 
 
-@app.route('/finish/<int:id>', methods=['GET', 'POST'])
+@bp.route('/finish/<int:id>', methods=['GET', 'POST'])
 def finish(id):
     book = db.get_or_404(Book, id)
     form = RateBookForm(
@@ -489,67 +1634,58 @@ def finish(id):
         book.date_started = form.date_started.data
         book.date_finished = form.date_finished.data
         db.session.commit()
-        return redirect(url_for('home'))
+        return redirect(url_for('books.home'))
 
     return render_template('finish.html', form=form, book=book)
 
 
-@app.route("/find/<string:target>")
+@bp.route("/find/<string:target>")
 def find(target):
     olid = request.args.get('id')
     if not olid:
-        return redirect(url_for('home'))
+        return redirect(url_for('books.home'))
 
-    results = search_openlibrary(olid, limit=1)
-    if not results:
-        return redirect(url_for('home'))
+    # Usually the doc the user just picked on the select page, so no second search
+    selected = openlibrary_search.get_doc(olid)
+    if not selected:
+        return redirect(url_for('books.home'))
+
+    # Already in the library: one indexed lookup instead of a failed insert
+    owned_id = owned_books([selected]).get(olid)
+    if owned_id:
+        return redirect(url_for('books.book_detail', book_id=owned_id))
 
-    selected = results[0]
-    book = book_from_result(selected, started=(target == "current"))
+    # Save the book right away and let a background job fill in genre, description and pages
+    book = stub_book_from_result(selected, started=(target == "current"))
     db.session.add(book)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # Another book with the same title (Book.title is unique)
+        db.session.rollback()
+        existing_id = db.session.execute(db.select(Book.id).where(Book.title == book.title)).scalar()
+        return redirect(url_for('books.book_detail', book_id=existing_id) if existing_id else url_for('books.home'))
+    job = queue_enrichment(book, selected)
     db.session.commit()
+    submit_job(job.id)
 
     if target == "current":
-        return redirect(url_for('home'))
+        return redirect(url_for('books.home'))
     elif target == "tbr":
-        return redirect(url_for('tbr'))
+        return redirect(url_for('books.tbr'))
     elif target == 'rate':
-        return redirect(url_for('edit', id=book.id))
+        return redirect(url_for('books.edit', id=book.id))
     else:
-        return redirect(url_for('edit', id=book.id))
+        return redirect(url_for('books.edit', id=book.id))
 
 
-@app.route('/stats')
+@bp.route('/stats')
+@page_cache.cached_page
 def stats():
     goal = 50
     current_year = datetime.now().year
 
-    # Get all finished books for stats
-    finished_books = Book.query.filter(Book.date_finished.isnot(None)).all()
-
-    # Convert to JSON for JavaScript
-    books_data = []
-    for book in finished_books:
-        books_data.append({
-            'title': book.title,
-            'author': book.author,
-            'year': book.year,
-            'star_rating': float(book.star_rating) if book.star_rating is not None else None,
-            'spice_rating': float(book.spice_rating) if book.spice_rating is not None else None,
-            'ranking': book.ranking,
-            'review': book.review,
-            'img_url': book.img_url,
-            'description': book.description,
-            'date_started': book.date_started.isoformat() if book.date_started else None,
-            'date_finished': book.date_finished.isoformat() if book.date_finished else None,
-            'pages': int(book.pages) if book.pages else None,
-            'genre': clean_genre([book.genre]) if book.genre else None,
-        })
-
-    read_books = Book.query.filter(
-        Book.date_finished.isnot(None),
-        Book.date_finished.between(f"{current_year}-01-01", f"{current_year}-12-31")
-    ).count()
+    read_books = db.session.execute(finished_in_year_query(current_year)).scalar()
 
     progress = int((read_books / goal) * 100) if goal > 0 else 0
 
@@ -557,34 +1693,150 @@ def stats():
                            goal=goal,
                            read_books=read_books,
                            progress=progress,
-                           books_data=books_data)
+                           current_year=current_year,
+                           stats=load_stats(current_year))
 
 
-@app.route('/book/<int:book_id>')
-def book_detail(book_id):
-    book = db.get_or_404(Book, book_id)
+@bp.app_template_global()
+def cover_url(book, size='medium'):
+    """URL of a locally cached cover; the v parameter changes with the source URL, so caching it forever is safe."""
+    if not book.img_url:
+        return None
+    return url_for('books.cover', book_id=book.id, size=size, v=covers.url_version(book.img_url))
 
-    # Probeer description op te halen via OpenLibrary API
-    description = None
-    if book.genre is None or True:  # altijd proberen als je wilt
-        if hasattr(book, 'work_key') and book.work_key:
-            try:
-                work_key = book.work_key
-                if work_key.startswith('/works/'):
-                    work_key = work_key[7:]
-                response = requests.get(f"https://openlibrary.org/works/{work_key}.json")
-                if response.status_code == 200:
-                    work_data = response.json()
-                    if isinstance(work_data.get('description'), dict):
-                        description = work_data['description'].get('value')
-                    else:
-                        description = work_data.get('description')
-            except:
-                description = None
 
-    return render_template('book_detail.html', book=book, description=description)
+@bp.route('/cover/<int:book_id>/<string:size>')
+def cover(book_id, size):
+    if size not in covers.SIZES:
+        abort(404)
+    book = db.get_or_404(Book, book_id)
+    if not book.img_url:
+        abort(404)
+
+    variant = covers.get_variant(book.img_url, size)
+    if variant is None:
+        # Couldn't fetch or resize it ourselves, let the browser try the original
+        return redirect(book.img_url)
+
+    path, etag = variant
+    response = send_file(path, mimetype='image/jpeg', etag=etag, conditional=True, max_age=COVER_MAX_AGE)
+    response.headers['Cache-Control'] = f"public, max-age={COVER_MAX_AGE}, immutable"
+    return response
+
+
+@bp.route('/search')
+def search():
+    query = request.args.get('q', '').strip()
+    books = search_library(query) if query else []
+    return render_template('search.html', query=query, books=books)
+
+
+@bp.route('/api/search')
+def search_api():
+    limit = max(1, min(request.args.get('limit', SEARCH_LIMIT, type=int), 100))
+    books = search_library(request.args.get('q', ''), limit=limit)
+    return jsonify([{
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'year': book.year,
+        'genre': book.genre,
+        'img_url': book.img_url,
+        'url': url_for('books.book_detail', book_id=book.id),
+    } for book in books])
+
+
+@bp.route('/api/stats')
+@page_cache.cached_page
+def stats_data():
+    """What the stats charts draw, fetched by static/js/stats.js so the page itself stays small."""
+    return jsonify(load_stats(datetime.now().year))
+
+
+@bp.route('/api/stats/books')
+def stats_books():
+    """The books behind one chart slice, fetched when it is clicked."""
+    slice_filter = stats_slice_filter(request.args.get('dimension'), request.args.get('bucket', ''))
+    if slice_filter is None:
+        return jsonify([])
+
+    books = db.session.execute(
+        db.select(Book.title, Book.author, Book.star_rating, Book.spice_rating, Book.pages, Book.genre)
+        .where(Book.date_finished.isnot(None), slice_filter)
+        .order_by(Book.date_finished.desc())
+    ).all()
+    return jsonify([{
+        'title': book.title,
+        'author': book.author,
+        'star_rating': book.star_rating,
+        'spice_rating': book.spice_rating,
+        'pages': book.pages,
+        'genre': clean_genre([book.genre]) if book.genre else None,
+    } for book in books])
+
 
+@bp.route('/book/<int:book_id>')
+def book_detail(book_id):
+    book = db.get_or_404(Book, book_id, options=[undefer_group('details')])
+
+    # Only local data here; stale OpenLibrary metadata is rechecked in the background for the next view,
+    # unless its enrichment job is still queued and about to fetch the same work anyway
+    status = enrichment_status(book.id)
+    if metadata_is_stale(book) and status not in ('pending', 'running'):
+        start_revalidation(book.id)
+
+    return render_template('book_detail.html', book=book, enrichment_status=status)
+
+
+@bp.route('/api/books/<int:book_id>/enrichment')
+def book_enrichment(book_id):
+    book = db.get_or_404(Book, book_id, options=[undefer_group('details')])
+    return jsonify({
+        'status': enrichment_status(book.id),
+        'pages': book.pages,
+        'genre': book.genre,
+        'description': book.description
+    })
+
+
+@bp.route('/export.<string:fmt>')
+def export_books(fmt):
+    if not exporter.available(fmt):
+        abort(404)
+    # Streamed as it is read, so the response starts right away and memory use doesn't grow with the library
+    chunks = exporter.write(fmt, EXPORT_FIELDS, book_export_chunks())
+    filename = f"books-{date.today().isoformat()}.{fmt}"
+    return Response(stream_with_context(chunks), mimetype=exporter.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    """Request, SQL, template and outbound API timings in the Prometheus text format."""
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+# ---------------------------------------------------- APP ------------------------------------------------------
+def create_app(config=None):
+    """Build the app. Cheap on purpose: no database or API access, so run `flask upgrade-db` before serving."""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DB_URI', "sqlite:///books.db")
+    if config:
+        app.config.update(config)
+
+    Bootstrap5(app)
+    csrf.init_app(app)
+    metrics.init_app(app)
+    compression.init_app(app)
+    assets.init_app(app)
+    db.init_app(app)
+    app.register_blueprint(bp)
+    return app
 
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
     app.run(debug=True)
@@ -0,0 +1,199 @@
+"""Per-request timings and Prometheus-style metrics.
+
+Every request gets a RequestTimings that the SQLAlchemy, template and HTTP
+hooks below add to while it runs. At the end, the totals go out as a
+Server-Timing header and are folded into the process-wide histograms and
+counters that /metrics renders in the Prometheus text format. Work done on
+pool threads (background enrichment, imports) still counts for the per-host
+HTTP metrics, but not for the request that happens to be running.
+
+Metrics live in process memory, so with several gunicorn workers each worker
+reports its own numbers and the scraper sees whichever worker answers.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import before_render_template, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.http_count = 0
+        self.http_seconds = 0.0
+        self.template_seconds = 0.0
+        self._template_starts = []
+
+    def server_timing(self, total):
+        """Value for the Server-Timing header, durations in milliseconds."""
+        return ', '.join([
+            f'db;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} queries"',
+            f'http;dur={self.http_seconds * 1000:.1f};desc="{self.http_count} calls"',
+            f'tpl;dur={self.template_seconds * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value:g}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", f"{bound:g}")])} {count}')
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, [("le", "+Inf")])} {series[-1]}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {series[-2]:.6f}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {series[-1]}')
+        return lines
+
+
+request_duration = Histogram('app_request_duration_seconds', 'Wall time per request.', ('route', 'method', 'status'))
+sql_queries = Counter('app_sql_queries_total', 'SQL statements executed while serving requests.', ('route',))
+sql_seconds = Counter('app_sql_seconds_total', 'Time spent in SQL statements while serving requests.', ('route',))
+template_seconds = Counter('app_template_seconds_total', 'Time spent rendering templates.', ('route',))
+http_duration = Histogram('app_outbound_http_duration_seconds', 'Latency of outbound API calls.', ('host',))
+http_responses = Counter('app_outbound_http_responses_total', 'Outbound API calls by host and status.',
+                         ('host', 'status'))
+
+METRICS = [request_duration, sql_queries, sql_seconds, template_seconds, http_duration, http_responses]
+
+# Extra (name, help, type, callable returning a number) read at scrape time
+collectors = []
+
+
+def add_collector(name, help, type, read):
+    collectors.append((name, help, type, read))
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, help, type, read in collectors:
+        lines.extend([f'# HELP {name} {help}', f'# TYPE {name} {type}', f'{name} {read():g}'])
+    return '\n'.join(lines) + '\n'
+
+
+# ---------- hooks ----------
+def record_http(host, status, seconds):
+    """Called by http_client for every call that actually went out over the network."""
+    http_duration.observe(seconds, host)
+    http_responses.inc(host, str(status))
+    timings = _current.get()
+    if timings is not None:
+        timings.http_count += 1
+        timings.http_seconds += seconds
+
+
+# The start time lives on the statement's execution context, so a statement that raises (and never
+# reaches after_cursor_execute) leaves nothing behind on the pooled connection
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, '_query_started_at', None)
+    timings = _current.get()
+    if timings is not None and started_at is not None:
+        timings.sql_count += 1
+        timings.sql_seconds += time.perf_counter() - started_at
+
+
+def _before_render_template(sender, template, context, **extra):
+    timings = _current.get()
+    if timings is not None:
+        timings._template_starts.append(time.perf_counter())
+
+
+def _template_rendered(sender, template, context, **extra):
+    timings = _current.get()
+    if timings is not None and timings._template_starts:
+        timings.template_seconds += time.perf_counter() - timings._template_starts.pop()
+
+
+def init_app(app):
+    """Time every request of a Flask app and add the Server-Timing header."""
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
+
+    @app.before_request
+    def start_request_timings():
+        _current.set(RequestTimings())
+
+    @app.after_request
+    def finish_request_timings(response):
+        timings = _current.get()
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.started_at
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_duration.observe(total, route, request.method, str(response.status_code))
+        sql_queries.inc(route, amount=timings.sql_count)
+        sql_seconds.inc(route, amount=timings.sql_seconds)
+        template_seconds.inc(route, amount=timings.template_seconds)
+        response.headers['Server-Timing'] = timings.server_timing(total)
+        return response
+
+    @app.teardown_request
+    def clear_request_timings(exc):
+        _current.set(None)
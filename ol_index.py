@@ -0,0 +1,222 @@
+"""Local OpenLibrary metadata index built from the published data dumps.
+
+The dumps (https://openlibrary.org/developers/dumps) are tab separated, one
+record per line: type, key, revision, last_modified, JSON. build() streams
+works, editions and authors dumps (plain or gzipped) into a SQLite file, and
+the lookups below answer from it so enrichment only goes to the network for
+books the index doesn't know.
+"""
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+INDEX_PATH = os.environ.get('OL_INDEX_PATH', 'ol_index.db')
+BATCH_SIZE = 10_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS works (
+    key TEXT PRIMARY KEY,
+    title TEXT,
+    norm_title TEXT,
+    author_key TEXT,
+    subjects TEXT,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS editions (
+    key TEXT PRIMARY KEY,
+    work_key TEXT,
+    pages INTEGER
+);
+CREATE TABLE IF NOT EXISTS authors (
+    key TEXT PRIMARY KEY,
+    norm_name TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_works_norm_title ON works (norm_title);
+CREATE INDEX IF NOT EXISTS ix_editions_work_key ON editions (work_key);
+"""
+
+_local = threading.local()
+
+
+def normalize(text):
+    """Case, punctuation and diacritics folded text, for matching titles and author names."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def short_key(key):
+    """'/works/OL45804W' -> 'OL45804W'"""
+    return key.rsplit('/', 1)[-1] if key else key
+
+
+def open_dump(path):
+    with open(path, 'rb') as f:
+        gzipped = f.read(2) == b'\x1f\x8b'
+    if gzipped:
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def parse_record(line):
+    """(type, key, data) for one dump line, or None if the line can't be read."""
+    parts = line.rstrip('\n').split('\t')
+    if len(parts) < 5:
+        return None
+    try:
+        return parts[0], parts[1], json.loads(parts[4])
+    except ValueError:
+        return None
+
+
+def _description(data):
+    description = data.get('description')
+    if isinstance(description, dict):
+        return description.get('value')
+    return description if isinstance(description, str) else None
+
+
+def _pages(data):
+    pages = data.get('number_of_pages')
+    if isinstance(pages, (int, float)) and pages > 0:
+        return int(pages)
+    return None
+
+
+def _rows(record_type, key, data):
+    """(table, row) for one dump record, or None for record types we don't keep."""
+    if record_type == '/type/work':
+        authors = data.get('authors') or []
+        author = authors[0].get('author') if authors and isinstance(authors[0], dict) else None
+        author_key = short_key(author.get('key')) if isinstance(author, dict) else None
+        subjects = [s for s in data.get('subjects', []) if isinstance(s, str)]
+        return 'works', (short_key(key), data.get('title'), normalize(data.get('title')), author_key,
+                         json.dumps(subjects), _description(data))
+    if record_type == '/type/edition':
+        works = data.get('works') or []
+        work_key = short_key(works[0].get('key')) if works and isinstance(works[0], dict) else None
+        return 'editions', (short_key(key), work_key, _pages(data))
+    if record_type == '/type/author':
+        return 'authors', (short_key(key), normalize(data.get('name')))
+    return None
+
+
+INSERTS = {
+    'works': 'INSERT OR REPLACE INTO works VALUES (?, ?, ?, ?, ?, ?)',
+    'editions': 'INSERT OR REPLACE INTO editions VALUES (?, ?, ?)',
+    'authors': 'INSERT OR REPLACE INTO authors VALUES (?, ?)',
+}
+
+
+def build(paths, index_path=INDEX_PATH, progress=None):
+    """Stream dump files into the index. Returns the number of records stored per table."""
+    conn = sqlite3.connect(index_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executescript(SCHEMA)
+    counts = {table: 0 for table in INSERTS}
+    batches = {table: [] for table in INSERTS}
+
+    def flush():
+        for table, rows in batches.items():
+            if rows:
+                conn.executemany(INSERTS[table], rows)
+                counts[table] += len(rows)
+                rows.clear()
+        conn.commit()
+        if progress:
+            progress(counts)
+
+    for path in paths:
+        with open_dump(path) as dump:
+            pending = 0
+            for line in dump:
+                record = parse_record(line)
+                rows = _rows(*record) if record else None
+                if rows is None:
+                    continue
+                table, row = rows
+                batches[table].append(row)
+                pending += 1
+                if pending >= BATCH_SIZE:
+                    flush()
+                    pending = 0
+    flush()
+    conn.close()
+    reset()
+    return counts
+
+
+def _connection():
+    """Read-only connection for this thread, or None when no index has been built."""
+    if getattr(_local, 'conn', None) is None:
+        if not os.path.exists(INDEX_PATH):
+            return None
+        _local.conn = sqlite3.connect(f"file:{INDEX_PATH}?mode=ro", uri=True)
+    return _local.conn
+
+
+def reset():
+    """Forget this thread's connection, e.g. after the index file was rebuilt."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+    _local.conn = None
+
+
+def _work(row):
+    if row is None:
+        return None
+    key, subjects, description = row
+    return {'key': key, 'subjects': json.loads(subjects or '[]'), 'description': description}
+
+
+def lookup_work(work_key):
+    """Subjects and description for a work key, or None on a miss."""
+    conn = _connection()
+    if conn is None or not work_key:
+        return None
+    return _work(conn.execute(
+        'SELECT key, subjects, description FROM works WHERE key = ?', (short_key(work_key),)
+    ).fetchone())
+
+
+def lookup_by_title_author(title, author):
+    conn = _connection()
+    if conn is None or not title or not author:
+        return None
+    return _work(conn.execute(
+        'SELECT works.key, works.subjects, works.description FROM works '
+        'JOIN authors ON authors.key = works.author_key '
+        'WHERE works.norm_title = ? AND authors.norm_name = ? LIMIT 1',
+        (normalize(title), normalize(author))
+    ).fetchone())
+
+
+def lookup_edition_pages(edition_key):
+    conn = _connection()
+    if conn is None or not edition_key:
+        return None
+    row = conn.execute('SELECT pages FROM editions WHERE key = ?', (short_key(edition_key),)).fetchone()
+    return row[0] if row else None
+
+
+def lookup_pages(edition_keys=(), work_key=None):
+    """Page count from the first listed edition that has one, else from any edition of the work."""
+    for edition_key in edition_keys:
+        pages = lookup_edition_pages(edition_key)
+        if pages:
+            return pages
+    conn = _connection()
+    if conn is None or not work_key:
+        return None
+    row = conn.execute(
+        'SELECT pages FROM editions WHERE work_key = ? AND pages IS NOT NULL LIMIT 1', (short_key(work_key),)
+    ).fetchone()
+    return row[0] if row else None
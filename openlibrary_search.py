@@ -0,0 +1,110 @@
+"""OpenLibrary search with a small in-memory cache in front of it.
+
+Only the fields the app uses are requested, the result count is capped by
+OpenLibrary instead of after download, and recent queries are kept in an LRU
+with a TTL. Only the exact (normalized) query is reused: OpenLibrary matches
+whole words, also in fields we don't fetch like subjects and ISBNs, so the
+results of "fou" or "fourth" say nothing about what "fourth wing" returns.
+Every doc we hand out is also remembered by OLID, so picking a result on the
+select page doesn't need a second search.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+import http_client
+
+SEARCH_URL = "https://openlibrary.org/search.json"
+
+# Everything select.html, find and the enrichment read from a search doc
+SEARCH_FIELDS = ','.join([
+    'key', 'title', 'author_name', 'first_publish_year', 'cover_i', 'number_of_pages_median', 'edition_key',
+])
+QUERY_TTL = 10 * 60
+MAX_QUERIES = 256
+MAX_DOCS = 2048
+
+
+class LRUCache:
+    """Thread-safe LRU mapping whose entries expire after ttl seconds."""
+
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# query -> (docs, complete); complete means OpenLibrary had no more results than we asked for
+query_cache = LRUCache(MAX_QUERIES, ttl=QUERY_TTL)
+doc_cache = LRUCache(MAX_DOCS, ttl=QUERY_TTL)
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+def olid_of(doc):
+    return doc.get('key', '').split('/')[-1]
+
+
+def search(query, limit=10):
+    """Search OpenLibrary and return at most `limit` docs."""
+    query = normalize_query(query)
+    if not query:
+        return []
+
+    cached = query_cache.get(query)
+    if cached is not None:
+        docs, complete = cached
+        if complete or len(docs) >= limit:
+            return docs[:limit]
+
+    try:
+        response = http_client.get(SEARCH_URL, params={'q': query, 'fields': SEARCH_FIELDS, 'limit': limit})
+    except requests.RequestException as e:
+        print(f"Error searching OpenLibrary for {query!r}: {e}")
+        return []
+    if response.status_code != 200:
+        return []
+    data = response.json()
+    docs = data.get('docs', [])[:limit]
+    query_cache.set(query, (docs, data.get('numFound', len(docs)) <= len(docs)))
+
+    for doc in docs:
+        doc_cache.set(olid_of(doc), doc)
+    return docs
+
+
+def get_doc(olid):
+    """The search doc for a work OLID: from an earlier search if we can, otherwise by searching for it."""
+    doc = doc_cache.get(olid)
+    if doc is not None:
+        return doc
+    results = search(olid, limit=1)
+    return results[0] if results else None
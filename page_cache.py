@@ -0,0 +1,126 @@
+"""Rendered pages cached against a library generation counter.
+
+Every commit that writes Book rows bumps one counter (track_writes). A cached
+page is stored together with the generation it was rendered at, and is only
+served while that is still the current generation, so there is nothing to
+invalidate per page: a write makes every older entry unreachable, and the
+next eviction clears them out. Anything else the pages show that changes
+without a Book write (rebuild_stats) calls invalidate().
+
+The counter and the pages live in a small SQLite file, which every gunicorn
+worker on the machine shares. Entries are evicted least recently used first
+once the file holds more than PAGE_CACHE_MAX_BYTES of page bodies (see
+sqlite_cache.py for how often that is checked).
+"""
+import functools
+import hashlib
+import os
+from datetime import date
+
+from flask import make_response, request
+from sqlalchemy import event
+
+from sqlite_cache import SQLiteCache
+
+PAGE_CACHE_PATH = os.environ.get('PAGE_CACHE_PATH', 'page_cache.db')
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+WRITES_FLAG = 'page_cache.library_changed'
+
+
+class PageCache(SQLiteCache):
+    table = 'pages'
+    columns = (('generation', 'INTEGER'), ('etag', 'TEXT'), ('mimetype', 'TEXT'))
+
+    def __init__(self, path=PAGE_CACHE_PATH, max_bytes=PAGE_CACHE_MAX_BYTES):
+        super().__init__(path, max_bytes)
+
+    def setup(self, conn):
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(pages)')}
+        if columns and 'mimetype' not in columns:
+            conn.execute('DROP TABLE pages')  # written by an older version, it's only a cache
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS generation (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO generation (id, value) VALUES (1, 0);
+        """)
+
+    def generation(self):
+        return self._connection().execute('SELECT value FROM generation WHERE id = 1').fetchone()[0]
+
+    def bump(self):
+        conn = self._connection()
+        conn.execute('UPDATE generation SET value = value + 1 WHERE id = 1')
+        conn.commit()
+
+    def stale(self):
+        return 'generation < ?', (self.generation(),)
+
+    def get(self, cache_key, generation):
+        """(etag, mimetype, body) if the page was stored at this generation, else None."""
+        return self.lookup(cache_key, ['etag', 'mimetype', 'body'], 'generation = ?', (generation,))
+
+    def set(self, cache_key, generation, body, mimetype='text/html'):
+        """Store a page and return its etag."""
+        etag = hashlib.sha256(body).hexdigest()[:16]
+        self.store(cache_key, body, generation=generation, etag=etag, mimetype=mimetype)
+        return etag
+
+
+cache = PageCache()
+
+
+def cached_page(view):
+    """Serve a view from the page cache, with an ETag so browsers can revalidate with a 304."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # Read the generation before rendering: a write during the render leaves the entry already stale
+        generation = cache.generation()
+        # Pages can depend on the date (the home page counts this year's books)
+        cache_key = f"{request.full_path}|{date.today().isoformat()}"
+        entry = cache.get(cache_key, generation)
+        if entry is not None:
+            etag, mimetype, body = entry
+            response = make_response(body)
+            response.mimetype = mimetype
+            response.headers['X-Page-Cache'] = 'hit'
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            etag = cache.set(cache_key, generation, response.get_data(), response.mimetype)
+            response.headers['X-Page-Cache'] = 'miss'
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'  # always revalidate, the ETag makes that cheap
+        return response.make_conditional(request)
+    return wrapper
+
+
+def invalidate():
+    """Make every cached page stale, for changes track_writes doesn't see."""
+    cache.bump()
+
+
+def track_writes(session_class, *models):
+    """Bump the generation after every commit that inserted, updated or deleted one of `models`."""
+    tables = {model.__table__ for model in models}
+
+    @event.listens_for(session_class, 'before_flush')
+    def note_flushed_writes(session, flush_context, instances):
+        changed = list(session.new) + list(session.dirty) + list(session.deleted)
+        if any(isinstance(obj, models) for obj in changed):
+            session.info[WRITES_FLAG] = True
+
+    @event.listens_for(session_class, 'do_orm_execute')
+    def note_bulk_writes(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            if getattr(orm_execute_state.statement, 'table', None) in tables:
+                orm_execute_state.session.info[WRITES_FLAG] = True
+
+    @event.listens_for(session_class, 'after_commit')
+    def bump_generation(session):
+        if session.info.pop(WRITES_FLAG, False):
+            cache.bump()
+
+    @event.listens_for(session_class, 'after_rollback')
+    def forget_writes(session):
+        session.info.pop(WRITES_FLAG, None)
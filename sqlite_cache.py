@@ -0,0 +1,128 @@
+"""Byte-capped, least recently used caches in a SQLite file.
+
+The API response cache (http_client) and the page cache (page_cache) both keep
+their entries in a small SQLite file that every gunicorn worker on the machine
+shares. SQLiteCache holds what they have in common; subclasses add their own
+columns and say which entries are stale.
+
+Both sit on hot paths, so reads and stores do as little writing as they can:
+a hit only refreshes accessed_at once it is more than TOUCH_INTERVAL old, and
+the cache is only measured and trimmed after a process has stored another
+EVICT_FRACTION of the byte cap. Each worker counts its own stores, so the file
+can overshoot the cap by up to that much per worker before it is trimmed.
+"""
+import sqlite3
+import threading
+import time
+
+# LRU order only needs to be roughly right, so a hit rewrites accessed_at at most this often (seconds)
+TOUCH_INTERVAL = 60
+EVICT_FRACTION = 0.05
+
+
+class SQLiteCache:
+    """cache_key -> body plus the subclass's `columns`, evicted least recently used first beyond max_bytes."""
+
+    table = None
+    columns = ()  # (name, SQL type) pairs stored next to the body
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_after = max(1, int(max_bytes * EVICT_FRACTION))
+        self._written = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def setup(self, conn):
+        """Hook for extra tables, or for dropping a table an older version wrote with other columns."""
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.setup(conn)
+            extra_columns = ''.join(f"{name} {sql_type} NOT NULL, " for name, sql_type in self.columns)
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    cache_key TEXT PRIMARY KEY,
+                    {extra_columns}
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_{self.table}_accessed_at ON {self.table} (accessed_at);
+            """)
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def stale(self):
+        """(SQL condition, parameters) matching entries that can never be served again, or None."""
+        return None
+
+    def lookup(self, cache_key, columns, condition='1', params=()):
+        """The requested columns of the entry, if it exists and matches `condition`, else None."""
+        conn = self._connection()
+        row = conn.execute(
+            f"SELECT {', '.join(columns)}, accessed_at FROM {self.table} WHERE cache_key = ? AND {condition}",
+            (cache_key, *params)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[-1] > TOUCH_INTERVAL:
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE cache_key = ?", (now, cache_key))
+            conn.commit()
+        return row[:-1]
+
+    def store(self, cache_key, body, **values):
+        """Insert or replace an entry. Bodies bigger than the whole cache are not stored."""
+        if len(body) > self.max_bytes:
+            return
+        names = ['cache_key', *values, 'body', 'size', 'accessed_at']
+        conn = self._connection()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            (cache_key, *values.values(), body, len(body), time.time())
+        )
+        conn.commit()
+        with self._lock:
+            self._written += len(body)
+            due = self._written >= self.evict_after
+            if due:
+                self._written = 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop stale entries, then the least recently used ones until we are under the byte cap."""
+        conn = self._connection()
+        stale = self.stale()
+        if stale:
+            condition, params = stale
+            conn.execute(f"DELETE FROM {self.table} WHERE {condition}", params)
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            freed = 0
+            stale_keys = []
+            for cache_key, size in conn.execute(f"SELECT cache_key, size FROM {self.table} ORDER BY accessed_at"):
+                stale_keys.append((cache_key,))
+                freed += size
+                if freed >= excess:
+                    break
+            conn.executemany(f"DELETE FROM {self.table} WHERE cache_key = ?", stale_keys)
+        conn.commit()
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute(f"DELETE FROM {self.table}")
+        conn.commit()
+
+    def size(self):
+        """(entries, bytes) currently stored."""
+        return self._connection().execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()
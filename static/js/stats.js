@@ -0,0 +1,209 @@
+// The chart data comes from data-stats-url, the books behind a chart slice from data-books-url
+const charts = document.getElementById('statsCharts');
+const booksUrl = charts.dataset.booksUrl;
+
+// The books behind a chart slice are only loaded when it is clicked
+function fetchBooks(dimension, bucket) {
+    const params = new URLSearchParams({dimension: dimension, bucket: bucket});
+    return fetch(`${booksUrl}?${params}`).then(response => response.json());
+}
+
+function bookCards(books, cardClass) {
+    return books.map(book => `
+        <div class="${cardClass}">
+            <div class="book-title">${book.title}</div>
+            <div class="book-author">by ${book.author}</div>
+            <div class="book-rating">⭐ ${book.star_rating || 'N/A'} | 🌶️ ${book.spice_rating || 'N/A'} ${book.pages ? `| 📖 ${book.pages} pages` : ''}</div>
+            ${book.genre ? `<div style="font-size: 0.8em; color: #ff1493; margin-top: 5px;">📚 ${book.genre}</div>` : ''}
+        </div>
+    `).join('');
+}
+
+function showPopup(title, dimension, bucket) {
+    const popup = document.getElementById('detailsPopup');
+    const overlay = document.getElementById('popupOverlay');
+    const popupTitle = document.getElementById('popupTitle');
+    const booksList = document.getElementById('popupBooksList');
+
+    popupTitle.textContent = title;
+    booksList.innerHTML = '<p style="text-align: center; color: #666; padding: 20px;">Loading…</p>';
+    overlay.style.display = 'block';
+    popup.style.display = 'block';
+
+    fetchBooks(dimension, bucket).then(books => {
+        if (books.length === 0) {
+            booksList.innerHTML = '<p style="text-align: center; color: #666; padding: 20px;">No books found in this category.</p>';
+        } else {
+            booksList.innerHTML = bookCards(books, 'popup-book-card');
+        }
+    });
+}
+
+function hidePopup() {
+    document.getElementById('detailsPopup').style.display = 'none';
+    document.getElementById('popupOverlay').style.display = 'none';
+}
+
+// Setup popup event listeners
+document.getElementById('closePopup').addEventListener('click', hidePopup);
+document.getElementById('popupOverlay').addEventListener('click', hidePopup);
+
+Chart.defaults.font.family = '"Nunito Sans", sans-serif';
+Chart.defaults.color = '#333';
+
+// Every chart gets {labels, counts}: parallel lists, in the order the buckets should be drawn
+function createGenreChart(genres) {
+    const ctx = document.getElementById('genreChart').getContext('2d');
+    new Chart(ctx, {
+        type: 'pie',
+        data: {
+            labels: genres.labels,
+            datasets: [{
+                data: genres.counts,
+                backgroundColor: ['#ff69b4','#ff1493','#ff91c7','#ff4da6','#ffa1d6','#ff77c7','#ff5fb8','#ff2e92','#ffadd6','#ff85c7'],
+                borderWidth: 2,
+                borderColor: '#fff'
+            }]
+        },
+        options: {
+            responsive: true,
+            plugins: {
+                legend: { position: 'bottom' }
+            },
+            onClick: (event, elements) => {
+                if (elements.length > 0) {
+                    const index = elements[0].index;
+                    const genre = genres.labels[index];
+                    showPopup(`📚 ${genre} Books (${genres.counts[index]} books)`, 'genre', genre);
+                }
+            }
+        }
+    });
+}
+
+function createPageCategoriesChart(cats) {
+    const ctx = document.getElementById('pageCategoriesChart').getContext('2d');
+    new Chart(ctx, {
+        type: 'doughnut',
+        data: {
+            labels: cats.labels,
+            datasets: [{
+                data: cats.counts,
+                backgroundColor: ['#ff91c7','#ff69b4','#ff1493','#ffc0cb'],
+                borderWidth: 2,
+                borderColor: '#fff'
+            }]
+        },
+        options: {
+            responsive: true,
+            plugins: {
+                legend: { position: 'bottom' }
+            },
+            onClick: (event, elements) => {
+                if (elements.length > 0) {
+                    const index = elements[0].index;
+                    const category = cats.labels[index];
+                    showPopup(`📖 ${category} Books (${cats.counts[index]} books)`, 'pages', category);
+                }
+            }
+        }
+    });
+}
+
+function createRatingChart(canvasId, ratings, dimension, colors, title) {
+    const labels = ratings.labels;
+    const ctx = document.getElementById(canvasId).getContext('2d');
+    new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: labels,
+            datasets: [{
+                label: 'Books',
+                data: ratings.counts,
+                backgroundColor: colors[0],
+                borderColor: colors[1],
+                borderWidth: 2,
+                borderRadius: 4
+            }]
+        },
+        options: {
+            responsive: true,
+            scales: {
+                y: {beginAtZero: true, ticks: {stepSize: 1}},
+                x: {grid: {display: false}}
+            },
+            plugins: {legend: {display: false}},
+            onClick: (event, elements) => {
+                if (elements.length > 0) {
+                    const index = elements[0].index;
+                    const rating = labels[index];
+                    showPopup(title(rating, ratings.counts[index]), dimension, rating);
+                }
+            }
+        }
+    });
+}
+
+function createMonthlyChart(monthlyData) {
+    const months = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec'];
+    const buckets = monthlyData.labels;
+
+    const ctx = document.getElementById('monthlyChart').getContext('2d');
+    new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: months,
+            datasets: [{
+                label: 'Books Finished',
+                data: monthlyData.counts,
+                backgroundColor: '#ff69b4',
+                borderColor: '#ff1493',
+                borderWidth: 2,
+                borderRadius: 6
+            }]
+        },
+        options: {
+            responsive: true,
+            onClick: (e, els) => {
+                if (els.length > 0) {
+                    const i = els[0].index;
+                    showMonthDetails(months[i], buckets[i]);
+                }
+            },
+            scales: {
+                y: {beginAtZero: true, ticks: {stepSize: 1}},
+                x: {grid: {display: false}}
+            },
+            plugins: {legend: {display: false}}
+        }
+    });
+}
+
+function showMonthDetails(month, bucket) {
+    const monthDetails = document.getElementById('monthDetails');
+    const selectedMonth = document.getElementById('selectedMonth');
+    const monthBooksList = document.getElementById('monthBooksList');
+
+    selectedMonth.textContent = `Books read in ${month}`;
+    monthBooksList.innerHTML = '<p style="text-align: center; color: #666;">Loading…</p>';
+    monthDetails.style.display = 'block';
+    monthDetails.scrollIntoView({behavior: 'smooth'});
+
+    fetchBooks('month', bucket).then(books => {
+        if (books.length === 0) {
+            monthBooksList.innerHTML = '<p style="text-align: center; color: #666;">No books finished this month.</p>';
+        } else {
+            monthBooksList.innerHTML = bookCards(books, 'month-book-card');
+        }
+    });
+}
+
+fetch(charts.dataset.statsUrl).then(response => response.json()).then(stats => {
+    createGenreChart(stats.genres);
+    createPageCategoriesChart(stats.pages);
+    createRatingChart('starRatingChart', stats.star, 'star', ['#ff69b4', '#ff1493'],
+        (rating, count) => `⭐ ${rating} Star Books (${count} books)`);
+    createRatingChart('spiceRatingChart', stats.spice, 'spice', ['#ff91c7', '#ff4da6'],
+        (rating, count) => `🌶️ ${rating} Spice Rating Books (${count} books)`);
+    createMonthlyChart(stats.months);
+});
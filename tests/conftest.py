@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# main.py and the caches read their paths at import, so point them away from the working copy first
+_work_dir = tempfile.mkdtemp(prefix='book-tests-')
+os.environ.update(
+    API_CACHE_PATH=os.path.join(_work_dir, 'api_cache.db'),
+    PAGE_CACHE_PATH=os.path.join(_work_dir, 'page_cache.db'),
+    OL_INDEX_PATH=os.path.join(_work_dir, 'missing-ol-index.db'),
+    IMPORT_DIR=os.path.join(_work_dir, 'imports'),
+    COVER_DIR=os.path.join(_work_dir, 'covers'),
+    SECRET_KEY='tests',
+)
+
+import pytest  # noqa: E402
+
+import http_client  # noqa: E402
+import openlibrary_search  # noqa: E402
+from stub_api import StubAPI  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    import main
+    app = main.create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'books.db'}",
+                           'WTF_CSRF_ENABLED': False, 'TESTING': True})
+    with app.app_context():
+        main.upgrade_schema()
+        yield app
+        main.db.session.remove()
+
+
+@pytest.fixture
+def stub_api(tmp_path, monkeypatch):
+    """The stub OpenLibrary / Google Books server, on a fresh session with empty caches and closed circuits."""
+    monkeypatch.setattr(http_client, '_session', None)
+    monkeypatch.setattr(http_client, 'cache', http_client.ResponseCache(str(tmp_path / 'api_cache.db')))
+    monkeypatch.setattr(http_client, 'breakers', {})
+    monkeypatch.setattr(http_client, 'rate_limiters', {})
+    monkeypatch.setattr(http_client, 'RETRY_BACKOFF', 0)
+    openlibrary_search.query_cache.clear()
+    openlibrary_search.doc_cache.clear()
+
+    server = StubAPI(latency=0).start()
+    server.install(http_client.get_session())
+    yield server
+    server.stop()
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import main
+
+
+def add_bare_books(*olids):
+    main.db.session.add_all(main.Book(title=f"Stub Book {olid}", author='Stub Author', year=2000, work_key=olid)
+                            for olid in olids)
+    main.db.session.commit()
+
+
+def book_rows():
+    return [tuple(row) for row in main.db.session.execute(
+        main.db.select(main.Book.id, main.Book.pages, main.Book.genre, main.Book.description, main.Book.enriched_at)
+        .order_by(main.Book.id))]
+
+
+def test_dry_run_reports_changes_but_writes_nothing(app, stub_api):
+    add_bare_books('OL1W', 'OL2W')
+    before = book_rows()
+
+    result = app.test_cli_runner().invoke(args=['backfill', '--dry-run'])
+    assert result.exit_code == 0, result.output
+    assert 'Checked 2 books' in result.output
+    assert '2 would change' in result.output
+    main.db.session.expire_all()
+    assert book_rows() == before
+
+
+def test_rerun_skips_books_that_are_fresh(app, stub_api):
+    add_bare_books('OL1W', 'OL2W')
+    enriched_before = datetime.utcnow() - timedelta(days=1)
+
+    checked, changes = main.backfill_books(enriched_before, chunk_size=1, workers=2)
+    assert (checked, changes['books']) == (2, 2)
+    main.db.session.expire_all()
+    assert all(pages and genre and description and enriched_at
+               for _, pages, genre, description, enriched_at in book_rows())
+
+    requests = stub_api.requests
+    assert main.backfill_books(enriched_before, workers=2) == (0, {})
+    assert stub_api.requests == requests
+
+    # --refresh looks at complete books again, but still not at ones enriched after the cutoff
+    assert main.backfill_books(enriched_before, refresh=True)[0] == 0
+    assert main.backfill_books(datetime.utcnow() + timedelta(seconds=1), refresh=True)[0] == 2
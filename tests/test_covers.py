@@ -0,0 +1,79 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import covers
+import main
+
+COVER_URL = 'https://covers.openlibrary.org/b/id/123-L.jpg'
+
+
+@pytest.fixture
+def cover_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(covers, 'COVER_DIR', str(tmp_path / 'covers'))
+    return tmp_path / 'covers'
+
+
+@pytest.fixture
+def book_id(app):
+    book = main.Book(title='Fourth Wing', author='Rebecca Yarros', year=2023, img_url=COVER_URL)
+    main.db.session.add(book)
+    main.db.session.commit()
+    return book.id
+
+
+def test_variants_fit_their_bounding_box(stub_api, cover_dir):
+    for size, (width, height) in covers.SIZES.items():
+        path, etag = covers.get_variant(COVER_URL, size)
+        with Image.open(path) as image:
+            assert image.format == 'JPEG'
+            assert image.width <= width and image.height <= height
+            assert max(image.width / width, image.height / height) == pytest.approx(1, abs=0.01)
+        assert etag.endswith(f"-{size}")
+
+
+def test_second_request_is_served_from_the_cache(stub_api, cover_dir):
+    first = covers.get_variant(COVER_URL, 'thumb')
+    requests = stub_api.requests
+    assert covers.get_variant(COVER_URL, 'thumb') == first
+    assert stub_api.requests == requests
+
+    # The same image behind another URL shares the variants (the stub's colour only depends on the name)
+    other = covers.get_variant('https://covers.openlibrary.org/b/olid/123-L.jpg', 'thumb')
+    assert other == first
+
+
+def test_evict_drops_the_least_recently_served_variants(stub_api, cover_dir):
+    old_path, _ = covers.get_variant(COVER_URL, 'large')
+    new_path, _ = covers.get_variant('https://covers.openlibrary.org/b/id/456-L.jpg', 'large')
+    os.utime(old_path, (1, 1))
+    sizes = sum(entry.stat().st_size for entry in os.scandir(cover_dir) if entry.name.endswith('.jpg'))
+
+    covers.evict(max_bytes=sizes - 1)
+    assert not os.path.exists(old_path)
+    assert os.path.exists(new_path)
+    # An evicted variant is rebuilt from the original on the next request
+    assert os.path.exists(covers.get_variant(COVER_URL, 'large')[0])
+
+
+def test_cover_route_caching_headers(app, stub_api, cover_dir, book_id):
+    client = app.test_client()
+    response = client.get(f"/cover/{book_id}/medium")
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert response.headers['Cache-Control'] == f"public, max-age={main.COVER_MAX_AGE}, immutable"
+    assert Image.open(io.BytesIO(response.data)).size[0] <= covers.SIZES['medium'][0]
+
+    etag = response.headers['ETag']
+    revalidated = client.get(f"/cover/{book_id}/medium", headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert client.get(f"/cover/{book_id}/huge").status_code == 404
+
+
+def test_cover_route_falls_back_to_the_original(app, stub_api, cover_dir, book_id):
+    stub_api.inject(10, status=500, path='/b/')
+    response = app.test_client().get(f"/cover/{book_id}/thumb")
+    assert response.status_code == 302
+    assert response.headers['Location'] == COVER_URL
@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+import http_client
+import main
+
+RESULT = {'key': '/works/OL1W', 'title': 'Fourth Wing', 'author_name': ['Rebecca Yarros'],
+          'first_publish_year': 2023, 'edition_key': ['OL1M']}
+
+
+@pytest.fixture
+def retries(monkeypatch):
+    """Jobs the code under test re-queued, as (job id, delay) instead of on a timer."""
+    submitted = []
+    monkeypatch.setattr(main, 'submit_job', lambda job_id, delay=0: submitted.append((job_id, delay)))
+    return submitted
+
+
+def queued_book(result=RESULT):
+    book = main.stub_book_from_result(result)
+    main.db.session.add(book)
+    main.db.session.flush()
+    job = main.queue_enrichment(book, result)
+    main.db.session.commit()
+    return book.id, job.id
+
+
+def open_breaker(host):
+    breaker = http_client.breakers[host] = http_client.CircuitBreaker(threshold=1, reset=60)
+    breaker.record_failure()
+
+
+def test_job_fills_in_the_book(app, stub_api, retries):
+    book_id, job_id = queued_book()
+    main.run_enrichment_job(app, job_id)
+
+    book = main.db.session.get(main.Book, book_id)
+    assert book.description == 'Stub description of OL1W.'
+    assert book.pages and book.genre
+    assert main.db.session.get(main.EnrichmentJob, job_id).status == 'done'
+    assert retries == []
+
+
+def test_job_falls_back_to_google_books_and_retries_later(app, stub_api, retries):
+    open_breaker('openlibrary.org')
+    book_id, job_id = queued_book()
+    main.run_enrichment_job(app, job_id)
+
+    book = main.db.session.get(main.Book, book_id)
+    assert (book.pages, book.description) == (320, 'Stub volume.')
+    job = main.db.session.get(main.EnrichmentJob, job_id)
+    assert job.status == 'pending'
+    assert job.last_error == 'Partial, circuit open for openlibrary.org'
+    assert retries == [(job_id, http_client.BREAKER_RESET)]
+
+
+def test_retry_keeps_the_data_it_already_has(app, stub_api, retries):
+    book_id, job_id = queued_book()
+    book = main.db.session.get(main.Book, book_id)
+    book.description = 'Stored description.'
+    main.db.session.commit()
+    # Every API down: the job ends without new data, and without losing the stored fields
+    stub_api.inject(100, status=503)
+    main.run_enrichment_job(app, job_id)
+
+    book = main.db.session.get(main.Book, book_id)
+    assert book.description == 'Stored description.'
+    assert book.title == 'Fourth Wing'
+
+
+def test_open_circuit_elsewhere_does_not_make_a_job_partial(app, stub_api, retries):
+    open_breaker('covers.openlibrary.org')
+    _, job_id = queued_book()
+    main.run_enrichment_job(app, job_id)
+
+    assert main.db.session.get(main.EnrichmentJob, job_id).status == 'done'
+    assert retries == []
+
+
+def test_job_gives_up_after_max_attempts(app, stub_api, retries, monkeypatch):
+    def failing_enrich(result):
+        raise RuntimeError('lookup crashed')
+
+    monkeypatch.setattr(main, 'enrich_result', failing_enrich)
+    _, job_id = queued_book()
+    for _ in range(main.MAX_JOB_ATTEMPTS):
+        main.run_enrichment_job(app, job_id)
+    job = main.db.session.get(main.EnrichmentJob, job_id)
+    assert (job.status, job.attempts, job.last_error) == ('failed', main.MAX_JOB_ATTEMPTS, 'lookup crashed')
+    assert len(retries) == main.MAX_JOB_ATTEMPTS - 1
+    assert json.loads(job.payload) == RESULT
+
+
+def test_book_detail_leaves_queued_books_to_their_job(app, stub_api, retries, monkeypatch):
+    revalidated = []
+    monkeypatch.setattr(main, 'start_revalidation', revalidated.append)
+    book_id, job_id = queued_book()
+    client = app.test_client()
+
+    assert client.get(f"/book/{book_id}").status_code == 200
+    assert revalidated == []
+
+    main.db.session.get(main.EnrichmentJob, job_id).status = 'done'
+    main.db.session.commit()
+    client.get(f"/book/{book_id}")
+    assert revalidated == [book_id]
+
+
+def test_resume_waits_for_the_scheduled_retry(app, stub_api, retries):
+    open_breaker('openlibrary.org')
+    _, partial_id = queued_book()
+    main.run_enrichment_job(app, partial_id)
+    _, fresh_id = queued_book(dict(RESULT, key='/works/OL2W', title='Iron Flame'))
+    retries.clear()
+
+    main.resume_enrichment_jobs()
+    delays = dict(retries)
+    assert delays[fresh_id] == 0
+    assert http_client.BREAKER_RESET - 5 < delays[partial_id] <= http_client.BREAKER_RESET
+
+
+def test_first_enrichment_stores_the_work_validators(app, stub_api, retries):
+    book_id, job_id = queued_book()
+    main.run_enrichment_job(app, job_id)
+    book = main.db.session.get(main.Book, book_id)
+    assert (book.work_etag, book.work_last_modified) == ('"OL1W-1"', 'Mon, 01 Jan 2024 00:00:00 GMT')
+
+    # So the first revalidation is already a cheap 304
+    assert http_client.revalidate('https://openlibrary.org/works/OL1W.json', etag=book.work_etag).status_code == 304
+    main.revalidate_book(app, book_id)
+    main.db.session.expire_all()
+    book = main.db.session.get(main.Book, book_id)
+    assert book.description == 'Stub description of OL1W.'
+    assert book.work_etag == '"OL1W-1"'
+
+
+def test_cached_work_response_keeps_its_validators(stub_api):
+    url = 'https://openlibrary.org/works/OL2W.json'
+    assert http_client.get(url).headers['ETag'] == '"OL2W-1"'
+    cached = http_client.get(url)
+    assert cached.from_cache
+    assert cached.headers == {'ETag': '"OL2W-1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+
+
+def test_finding_an_owned_work_again_opens_it(app, stub_api, retries):
+    client = app.test_client()
+    response = client.get('/find/tbr?id=OL7W')
+    assert response.status_code == 302
+    book_id = main.db.session.execute(main.db.select(main.Book.id)).scalar_one()
+    assert retries == [(main.db.session.execute(main.db.select(main.EnrichmentJob.id)).scalar_one(), 0)]
+
+    response = client.get('/find/current?id=OL7W')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(f"/book/{book_id}")
+    assert main.db.session.execute(main.db.select(main.func.count(main.Book.id))).scalar() == 1
+    assert main.db.session.execute(main.db.select(main.func.count(main.EnrichmentJob.id))).scalar() == 1
+    assert len(retries) == 1
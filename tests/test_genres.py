@@ -0,0 +1,15 @@
+import genres
+from bench_genres import synthetic_subject_lists
+
+
+def test_batch_classification_matches_one_book_at_a_time():
+    subject_lists = synthetic_subject_lists(200, 20) + [[], None, ['Fiction'], ['juvenile_books'],
+                                                         ['A subject far too long to be a genre name']]
+    assert genres.categorize_genres(subject_lists) == [genres.categorize_genre(s) for s in subject_lists]
+
+
+def test_batch_clean_genre_matches_one_book_at_a_time():
+    category_lists = [['Fiction / Fantasy / Epic'], ['Young Adult Fiction'], ['Fiction'], ['Cooking / General'], []]
+    titles = ['', '', 'The Dragon Throne', '', '']
+    assert genres.clean_genres(category_lists, titles) == \
+        [genres.clean_genre(c, t) for c, t in zip(category_lists, titles)]
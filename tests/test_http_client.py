@@ -0,0 +1,103 @@
+import time
+
+import pytest
+import requests
+
+import http_client
+
+SEARCH_URL = 'https://openlibrary.org/search.json'
+WORK_URL = 'https://openlibrary.org/works/OL1W.json'
+
+
+def open_breaker(host, reset=60):
+    breaker = http_client.breakers[host] = http_client.CircuitBreaker(threshold=1, reset=reset)
+    breaker.record_failure()
+    return breaker
+
+
+def test_retries_server_errors(stub_api):
+    stub_api.inject(2, status=503, path='/works/')
+    response = http_client.fetch(WORK_URL)
+    assert response.status_code == 200
+    assert stub_api.requests == 3
+    assert not http_client.breaker_for('openlibrary.org').failures
+
+
+def test_retries_timeouts(stub_api, monkeypatch):
+    monkeypatch.setitem(http_client.TIMEOUTS, 'openlibrary.org', (1, 0.2))
+    stub_api.inject(1, delay=0.5, path='/works/')
+    assert http_client.fetch(WORK_URL).status_code == 200
+    assert stub_api.requests == 2
+
+
+def test_gives_up_after_max_retries(stub_api):
+    stub_api.inject(10, status=503)
+    assert http_client.fetch(WORK_URL).status_code == 503
+    assert stub_api.requests == http_client.MAX_RETRIES + 1
+    assert http_client.breaker_for('openlibrary.org').failures == 1
+
+
+def test_a_final_429_counts_as_a_failure(stub_api):
+    stub_api.inject(10, status=429)
+    assert http_client.fetch(WORK_URL).status_code == 429
+    assert http_client.breaker_for('openlibrary.org').failures == 1
+
+
+def test_breaker_opens_after_threshold_failures(stub_api):
+    http_client.breakers['openlibrary.org'] = http_client.CircuitBreaker(threshold=2, reset=60)
+    stub_api.inject(10, status=500, path='/works/')
+    for _ in range(2):
+        http_client.fetch(WORK_URL)
+    calls = stub_api.requests
+
+    with pytest.raises(http_client.CircuitOpenError):
+        http_client.fetch(WORK_URL)
+    assert stub_api.requests == calls
+    # Other hosts are still called
+    assert http_client.fetch('https://www.googleapis.com/books/v1/volumes').status_code == 200
+
+
+def test_half_open_trial_closes_the_breaker(stub_api):
+    breaker = open_breaker('openlibrary.org', reset=0.05)
+    time.sleep(0.1)
+    assert http_client.fetch(WORK_URL).status_code == 200
+    assert not breaker.is_open
+    assert http_client.fetch(WORK_URL).status_code == 200
+
+
+def test_failed_trial_reopens_the_breaker(stub_api):
+    breaker = open_breaker('openlibrary.org', reset=0.05)
+    time.sleep(0.1)
+    stub_api.inject(10, status=503)
+    http_client.fetch(WORK_URL)
+    assert breaker.is_open
+    with pytest.raises(http_client.CircuitOpenError):
+        http_client.fetch(WORK_URL)
+
+
+def test_a_trial_that_raises_does_not_block_the_host(stub_api, monkeypatch):
+    breaker = open_breaker('openlibrary.org', reset=0.05)
+    time.sleep(0.1)
+
+    def broken_get(url, **kwargs):
+        raise ValueError('not a requests error')
+
+    with monkeypatch.context() as m:
+        m.setattr(http_client.get_session(), 'get', broken_get)
+        with pytest.raises(ValueError):
+            http_client.fetch(WORK_URL)
+    assert http_client.fetch(WORK_URL).status_code == 200
+    assert not breaker.is_open
+
+
+def test_skipped_hosts_only_sees_its_own_calls(stub_api):
+    open_breaker('covers.openlibrary.org')
+    with http_client.skipped_hosts() as skipped:
+        http_client.fetch(SEARCH_URL)
+    assert skipped == set()
+
+    open_breaker('openlibrary.org')
+    with http_client.skipped_hosts() as skipped:
+        with pytest.raises(requests.ConnectionError):
+            http_client.fetch(SEARCH_URL)
+    assert skipped == {'openlibrary.org'}
@@ -0,0 +1,64 @@
+import io
+
+import pytest
+
+import importer
+import main
+
+OLIDS = ['OL1W', 'OL2W', 'OL3W', 'OL4W', 'OL5W']
+
+
+def library_titles():
+    return sorted(main.db.session.execute(main.db.select(main.Book.title)).scalars())
+
+
+def test_goodreads_rows():
+    csv = ('Title,Author,ISBN13,My Rating,Date Read,Exclusive Shelf\n'
+           'Fourth Wing,Rebecca Yarros,"=""9781649374042""",5,2023/11/02,read\n'
+           ',Nobody,,0,,to-read\n')
+    rows = list(importer.read_rows(io.StringIO(csv)))
+    assert len(rows) == 1
+    assert rows[0]['isbn'] == '9781649374042'
+    assert rows[0]['star_rating'] == 5.0
+    assert importer.search_query(rows[0]) == 'isbn:9781649374042'
+
+
+def test_interrupted_import_resumes_from_its_checkpoint(app, stub_api, tmp_path, monkeypatch):
+    path = tmp_path / 'olids.txt'
+    path.write_text('\n'.join(f"/works/{olid}" for olid in OLIDS) + '\n')
+    checkpoint = importer.Checkpoint(str(tmp_path / 'olids.txt.checkpoint.json'))
+
+    resolve = main.resolve_import_row
+
+    def crash_on_the_third_book(row, result, details):
+        if row['olid'] == 'OL3W':
+            raise RuntimeError('worker killed')
+        return resolve(row, result, details)
+
+    with monkeypatch.context() as m:
+        m.setattr(main, 'resolve_import_row', crash_on_the_third_book)
+        with pytest.raises(RuntimeError), importer.open_text(str(path)) as stream:
+            main.import_books(stream, checkpoint, batch_size=2, workers=2)
+    assert library_titles() == ['Stub Book OL1W', 'Stub Book OL2W']
+
+    # A new process picks up the checkpoint file where the batch before the crash left it
+    checkpoint = importer.Checkpoint(checkpoint.path)
+    assert (checkpoint.done, checkpoint.imported, checkpoint.finished) == (2, 2, False)
+    with importer.open_text(str(path)) as stream:
+        processed, _ = main.import_books(stream, checkpoint, batch_size=2, workers=2)
+
+    assert processed == 3
+    assert library_titles() == [f"Stub Book {olid}" for olid in OLIDS]
+    assert (checkpoint.done, checkpoint.imported, checkpoint.finished) == (5, 5, True)
+
+
+def test_books_already_in_the_library_are_skipped(app, stub_api, tmp_path):
+    path = tmp_path / 'olids.txt'
+    path.write_text('OL1W\nOL2W\nOL1W\n')
+    for _ in range(2):
+        checkpoint = importer.Checkpoint(str(tmp_path / 'olids.txt.checkpoint.json'))
+        checkpoint.reset()
+        with importer.open_text(str(path)) as stream:
+            main.import_books(stream, checkpoint)
+    assert library_titles() == ['Stub Book OL1W', 'Stub Book OL2W']
+    assert (checkpoint.imported, checkpoint.skipped) == (0, 3)
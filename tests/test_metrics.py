@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import main
+import metrics
+
+
+def test_failed_statement_does_not_skew_later_timings(app):
+    timings = metrics.RequestTimings()
+    token = metrics._current.set(timings)
+    try:
+        with pytest.raises(OperationalError):
+            main.db.session.execute(main.text('SELECT * FROM no_such_table'))
+        main.db.session.rollback()
+        main.db.session.execute(main.text('SELECT 1'))
+    finally:
+        metrics._current.reset(token)
+
+    connection = main.db.session.connection()
+    assert 'query_started_at' not in connection.info
+    assert timings.sql_count >= 1
+    assert 0 <= timings.sql_seconds < 1
+
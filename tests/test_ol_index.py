@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import ol_index
+from conftest import FIXTURES
+
+DUMPS = [os.path.join(FIXTURES, f"ol_dump_{name}.txt.gz") for name in ('works', 'editions', 'authors')]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ol_index.db')
+    counts = ol_index.build(DUMPS, index_path=path)
+    monkeypatch.setattr(ol_index, 'INDEX_PATH', path)
+    ol_index.reset()
+    yield counts
+    ol_index.reset()
+
+
+def test_build_skips_records_it_does_not_keep(index):
+    # The redirect and the broken line in the works dump are left out
+    assert index == {'works': 2, 'editions': 3, 'authors': 2}
+
+
+def test_lookup_work(index):
+    work = ol_index.lookup_work('/works/OL1W')
+    assert work['key'] == 'OL1W'
+    assert work['subjects'] == ['Fantasy fiction', 'Dragons', 'Romance']
+    assert work['description'].startswith('Twenty-year-old Violet')
+    # Plain string descriptions and works without subjects
+    assert ol_index.lookup_work('OL2W') == {'key': 'OL2W', 'subjects': [],
+                                            'description': "Gervaise in the Goutte-d'Or."}
+    assert ol_index.lookup_work('OL3W') is None
+
+
+def test_lookup_by_title_author_folds_case_and_diacritics(index):
+    assert ol_index.lookup_by_title_author('fourth wing', 'REBECCA YARROS')['key'] == 'OL1W'
+    assert ol_index.lookup_by_title_author("L'assommoir", 'Emile Zola')['key'] == 'OL2W'
+    assert ol_index.lookup_by_title_author('Fourth Wing', 'Emile Zola') is None
+
+
+def test_lookup_pages(index):
+    assert ol_index.lookup_edition_pages('/books/OL1M') == 528
+    assert ol_index.lookup_edition_pages('OL2M') is None
+    # An edition without a page count falls back to another edition of the work
+    assert ol_index.lookup_pages(['OL2M'], 'OL1W') == 528
+    assert ol_index.lookup_pages(['OL2M', 'OL3M']) == 416
+    assert ol_index.lookup_pages([], 'OL9W') is None
+
+
+def test_lookups_without_an_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(ol_index, 'INDEX_PATH', str(tmp_path / 'missing.db'))
+    ol_index.reset()
+    assert ol_index.lookup_work('OL1W') is None
+    assert ol_index.lookup_pages(['OL1M'], 'OL1W') is None
+
+
+def test_enrichment_answers_from_the_index_without_network_calls(index, stub_api):
+    import main
+    result = {'key': '/works/OL1W', 'title': 'Fourth Wing', 'author_name': ['Rebecca Yarros'],
+              'edition_key': ['OL2M', 'OL1M']}
+    details = main.enrich_result(result)
+    assert details['genre'] == 'Romance'
+    assert details['pages'] == 528
+    assert details['description'].startswith('Twenty-year-old Violet')
+    assert stub_api.requests == 0
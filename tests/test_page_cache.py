@@ -0,0 +1,62 @@
+from datetime import date
+
+import page_cache
+import sqlite_cache
+
+
+def test_hits_only_refresh_accessed_at_once_it_is_old(tmp_path, monkeypatch):
+    cache = page_cache.PageCache(str(tmp_path / 'pages.db'), max_bytes=1000)
+    cache.set('/', 0, b'home')
+    conn = cache._connection()
+    conn.execute("UPDATE pages SET accessed_at = 100")
+    conn.commit()
+
+    monkeypatch.setattr(sqlite_cache.time, 'time', lambda: 100 + sqlite_cache.TOUCH_INTERVAL)
+    assert cache.get('/', 0)[2] == b'home'
+    assert conn.execute("SELECT accessed_at FROM pages").fetchone()[0] == 100
+
+    monkeypatch.setattr(sqlite_cache.time, 'time', lambda: 101 + sqlite_cache.TOUCH_INTERVAL)
+    cache.get('/', 0)
+    assert conn.execute("SELECT accessed_at FROM pages").fetchone()[0] == 101 + sqlite_cache.TOUCH_INTERVAL
+
+
+def test_evicts_least_recently_used_once_enough_was_stored(tmp_path, monkeypatch):
+    cache = page_cache.PageCache(str(tmp_path / 'pages.db'), max_bytes=1000)
+    assert cache.evict_after == 50
+    clock = iter(range(100, 200))
+    monkeypatch.setattr(sqlite_cache.time, 'time', lambda: next(clock))
+    cache.set('/a', 0, b'a' * 40)
+    cache.max_bytes = 10
+    cache.set('/b', 0, b'b' * 5)
+    # Over the cap, but this process has only stored 45 bytes since it last checked
+    assert cache.size() == (2, 45)
+
+    cache.set('/c', 0, b'c' * 5)
+    assert cache.size() == (2, 10)
+    assert cache.get('/a', 0) is None
+
+
+def test_eviction_drops_older_generations(tmp_path):
+    cache = page_cache.PageCache(str(tmp_path / 'pages.db'), max_bytes=100)
+    cache.set('/old', cache.generation(), b'old')
+    cache.bump()
+    cache.evict()
+    assert cache.size() == (0, 0)
+
+
+def test_rebuild_stats_invalidates_cached_stats(app):
+    import main
+    client = app.test_client()
+    assert client.get('/api/stats').headers['X-Page-Cache'] == 'miss'
+    assert client.get('/api/stats').headers['X-Page-Cache'] == 'hit'
+
+    # A finished book written behind the ORM's back, so neither the rollup nor the page cache saw it
+    main.db.session.execute(main.text("INSERT INTO book (title, author, year, date_finished) "
+                                      "VALUES ('Fourth Wing', 'Rebecca Yarros', 2023, :today)"),
+                            {'today': date.today()})
+    main.db.session.commit()
+    assert client.get('/api/stats').headers['X-Page-Cache'] == 'hit'
+    main.rebuild_stats()
+    response = client.get('/api/stats')
+    assert response.headers['X-Page-Cache'] == 'miss'
+    assert response.json['total_books'] == 1
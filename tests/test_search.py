@@ -0,0 +1,50 @@
+import main
+
+
+def add_book(title, author='Someone', **fields):
+    book = main.Book(title=title, author=author, year=2020, **fields)
+    main.db.session.add(book)
+    main.db.session.commit()
+    return book
+
+
+def titles(query):
+    return [book.title for book in main.search_library(query)]
+
+
+def test_index_follows_inserts_updates_and_deletes(app):
+    book = add_book('Fourth Wing', 'Rebecca Yarros', description='Dragon riders at war college.')
+    assert titles('dragon') == ['Fourth Wing']
+    assert titles('yarr') == ['Fourth Wing']  # the last term matches as a prefix
+
+    book.description = 'Griffin flyers.'
+    book.review = 'Couldn\'t put it down'
+    main.db.session.commit()
+    assert titles('dragon') == []
+    assert titles('griffin') == ['Fourth Wing']
+    assert titles('put down') == ['Fourth Wing']
+
+    main.db.session.delete(book)
+    main.db.session.commit()
+    assert titles('griffin') == []
+    assert titles('fourth') == []
+
+
+def test_title_and_author_matches_rank_first(app):
+    add_book('A Court of Thorns and Roses', description='A story with a dragon on every page, dragon after dragon.')
+    add_book('Dragon Republic', 'R. F. Kuang')
+    add_book('Iron Flame', 'Dragon Author')
+    add_book('Unrelated', description='Nothing to see here.')
+
+    ranked = titles('dragon')
+    assert set(ranked[:2]) == {'Dragon Republic', 'Iron Flame'}
+    assert ranked[2:] == ['A Court of Thorns and Roses']
+    assert titles('dragon republic') == ['Dragon Republic']
+
+
+def test_search_api_caps_the_limit(app):
+    for i in range(3):
+        add_book(f"Dragon {i}")
+    client = app.test_client()
+    assert len(client.get('/api/search?q=dragon&limit=2').json) == 2
+    assert len(client.get('/api/search?q=dragon&limit=0').json) == 1
@@ -0,0 +1,45 @@
+from datetime import date
+
+import main
+
+
+def add_finished(title, pages, rating, genre='Fantasy'):
+    main.db.session.add(main.Book(title=title, author='Author', year=2024, pages=pages, star_rating=rating,
+                                  genre=genre, date_finished=date(2024, 3, 1)))
+    main.db.session.commit()
+
+
+def rollup():
+    return {(row.dimension, row.bucket): (row.books, row.pages, row.rating_sum, row.rating_count)
+            for row in main.db.session.execute(main.db.select(main.StatsRollup)).scalars()}
+
+
+def test_rollup_upsert_adds_to_existing_slices(app):
+    add_finished('One', 250, 4.0)
+    add_finished('Two', 450, 5.0)
+    add_finished('Three', 200, None, genre='Romance')
+    assert rollup()[('total', 'all')] == (3, 900, 9.0, 2)
+    assert rollup()[('pages', '≤300 pages')] == (2, 450, 4.0, 1)
+
+    book = main.db.session.execute(main.db.select(main.Book).filter_by(title='One')).scalar_one()
+    book.pages = 600
+    main.db.session.commit()
+    main.db.session.delete(book)
+    main.db.session.commit()
+    incremental = {key: value for key, value in rollup().items() if value[0]}
+
+    main.rebuild_stats()
+    assert incremental == rollup()
+
+
+def test_api_stats_keeps_bucket_order(app):
+    add_finished('One', 250, 4.0)
+    add_finished('Two', 600, 4.5)
+    add_finished('Three', 700, 4.5, genre='Romance')
+
+    stats = app.test_client().get('/api/stats').json
+    assert stats['pages'] == {'labels': main.PAGE_BUCKETS, 'counts': [1, 0, 2, 0]}
+    assert stats['star']['labels'] == main.RATING_LABELS
+    assert stats['star']['counts'][main.RATING_LABELS.index('4.5')] == 2
+    assert stats['genres'] == {'labels': ['Fantasy', 'Romance'], 'counts': [2, 1]}
+    assert len(stats['months']['labels']) == 12